@@ -2,10 +2,23 @@ import cv2
 import json
 import time
 import fcntl
+import argparse
 import numpy as np
 import os
-from ultralytics import YOLO
-from deep_sort_realtime.deepsort_tracker import DeepSort
+from startup import parallel_startup, load_detector, create_tracker, open_camera
+
+START_TIME = time.perf_counter()  # 用于统计首帧耗时
+
+# 命令行参数
+parser = argparse.ArgumentParser(description="非机动车违停检测")
+parser.add_argument("--source", default="0", help="摄像头编号或视频文件路径")
+parser.add_argument("--embedder", choices=["yolo", "mobilenet"], default="yolo",
+                    help="外观特征来源：yolo 复用 YOLO 颈部特征；mobilenet 使用内置 MobileNetV2（启用 TorchScript 缓存）")
+parser.add_argument("--exit-after-first-frame", action="store_true",
+                    help="处理完第一帧后退出，用于测量首帧耗时")
+parser.add_argument("--no-display", action="store_true", help="不显示画面（无显示器的部署环境）")
+args = parser.parse_args()
+source = int(args.source) if args.source.isdigit() else args.source
 
 # 创建日志目录和图片存储目录
 os.makedirs("logs", exist_ok=True)
@@ -31,13 +44,30 @@ def log_event(event_type, obj_id, data=None):
         finally:
             fcntl.flock(f, fcntl.LOCK_UN)
 
-# 加载 YOLO 模型
-model = YOLO("models/yolov8n.pt")
+# 并行启动：加载 YOLO 模型（含预热）、初始化 DeepSORT（mobilenet 模式下含特征模型的加载与预热）、打开摄像头
 # 初始化 DeepSORT（使用较高的max_age、n_init、nn_budget以适应场景）
-deepsort = DeepSort(max_age=60, n_init=5, nn_budget=200)
+if args.embedder == "mobilenet":
+    # 优化后的模型缓存为 TorchScript，重启时直接加载
+    tracker_kwargs = dict(embedder="mobilenet", embedder_cache=True)
+else:
+    tracker_kwargs = dict(embedder=None)
+startup_results, startup_timings = parallel_startup({
+    "detector": lambda: load_detector("models/yolov8n.pt"),
+    "tracker": lambda: create_tracker(max_age=60, n_init=5, nn_budget=200, **tracker_kwargs),
+    "camera": lambda: open_camera(source),
+})
+model = startup_results["detector"]
+deepsort = startup_results["tracker"]
+cap = startup_results["camera"]
+print("启动各步骤耗时(秒):", {name: round(t, 2) for name, t in startup_timings.items()})
+
+# yolo 模式：外观特征直接取自 YOLO 的颈部特征图（P3-P5），不再额外运行 MobileNetV2
+# （在模型加载后再导入，使 torch 的导入与其他启动步骤并行）
+neck_embedder = None
+if args.embedder == "yolo":
+    from deep_sort_realtime.embedder.embedder_yolo import YOLOv8_Neck_Embedder
+    neck_embedder = YOLOv8_Neck_Embedder(model)
 
-# 打开摄像头
-cap = cv2.VideoCapture(0)
 if not cap.isOpened():
     print("摄像头未打开！")
     exit()
@@ -59,33 +89,10 @@ if os.path.exists(json_file):
     except json.JSONDecodeError:
         parking_data = {}
 
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-    current_time = time.time()
-    active_ids = set()
-
-    # YOLO 检测：将当前帧输入模型，获得检测结果
-    results = model(frame)
-    detections = []
-    for result in results:
-        for box in result.boxes:
-            if len(box.xyxy) == 0:
-                continue
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0].item())
-            cls = int(box.cls[0].item())
-            cls_name = model.names[cls]
-            print(f"检测到: {cls_name} (置信度={conf:.2f})")
-            # 只检测摩托车（或自行车），根据需要调整类别
-            if conf > 0.5 and cls in [1, 3]:
-                detections.append([x1, y1, x2, y2, conf])
 
-    # 格式化检测数据：DeepSORT 要求格式 [[[x1,y1,x2,y2], conf], ...]
-    formatted_detections = [[[d[0], d[1], d[2], d[3]], d[4]] for d in detections]
-    print("Formatted Detections:", formatted_detections)
-    tracked_objects = deepsort.update_tracks(formatted_detections, frame=frame)
+def handle_tracks(frame, current_time, tracked_objects):
+    """绘制跟踪结果、进行违停判断并显示画面；按下 q 时返回 False"""
+    active_ids = set()
     print("Tracked Objects:", tracked_objects)
 
     # 遍历跟踪对象，直接使用预测框，不再额外平滑
@@ -139,12 +146,71 @@ while cap.isOpened():
     with open(json_file, "w") as f:
         json.dump(parking_data, f, indent=4)
 
+    if args.no_display:
+        return True
     cv2.imshow("Non-Motor Vehicle Tracker", frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
+    return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+
+# 流水线：第 t 帧的特征提取与跟踪在后台线程中进行，同时主线程对第 t+1 帧做 YOLO 检测
+pending = None  # 上一帧的 (图像, 时间, 跟踪结果 Future)
+first_frame_time = None
+running = True
+while running and cap.isOpened():
+    ret, frame = cap.read()
+    if not ret:
         break
+    current_time = time.time()
+
+    # YOLO 检测：将当前帧输入模型，获得检测结果
+    results = model(frame)
+    detections = []
+    for result in results:
+        for box in result.boxes:
+            if len(box.xyxy) == 0:
+                continue
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            conf = float(box.conf[0].item())
+            cls = int(box.cls[0].item())
+            cls_name = model.names[cls]
+            print(f"检测到: {cls_name} (置信度={conf:.2f})")
+            # 只检测摩托车（或自行车），根据需要调整类别
+            if conf > 0.5 and cls in [1, 3]:
+                detections.append([x1, y1, x2, y2, conf])
+
+    # 格式化检测数据：DeepSORT 要求格式 [[[x1,y1,x2,y2], conf], ...]
+    formatted_detections = [[[d[0], d[1], d[2], d[3]], d[4]] for d in detections]
+    print("Formatted Detections:", formatted_detections)
+    ltwh_boxes = [[d[0], d[1], d[2] - d[0], d[3] - d[1]] for d in detections]
+    if neck_embedder is not None:
+        # yolo 模式：在下一次 YOLO 推理之前，从本帧的特征图中池化每个检测框的外观特征（框格式为 [左, 上, 宽, 高]）
+        embeds = neck_embedder.predict(frame, ltwh_boxes)
+        track_detections = formatted_detections
+    else:
+        # mobilenet 模式：特征提取交给后台线程，与下一帧的 YOLO 检测并行（并可走 lazy_embedding / refresh_interval）；
+        # 后台线程按框裁剪图像，因此传入 [左, 上, 宽, 高] 格式的框
+        embeds = None
+        track_detections = [[box, d[4]] for box, d in zip(ltwh_boxes, detections)]
+
+    # 先处理上一帧的跟踪结果（必须在提交下一帧之前读取），再提交当前帧
+    if pending is not None:
+        running = handle_tracks(pending[0], pending[1], pending[2].result())
+        if first_frame_time is None:
+            first_frame_time = time.perf_counter() - START_TIME
+            print(f"首帧耗时: {first_frame_time:.2f} 秒")
+            if args.exit_after_first_frame:
+                running = False
+                break
+    pending = (frame, current_time, deepsort.update_tracks_async(track_detections, embeds=embeds, frame=frame))
+
+# 处理最后一帧
+if pending is not None and running:
+    handle_tracks(pending[0], pending[1], pending[2].result())
+deepsort.shutdown()
 
 cap.release()
-cv2.destroyAllWindows()
+if not args.no_display:
+    cv2.destroyAllWindows()
 
 
 
@@ -0,0 +1,91 @@
+"""Cosine parity and throughput of the int8 quantized MobileNetV2 embedder
+against the fp32 one.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_embedder_int8 --calib path/to/calib_crops \
+        --crops path/to/eval_crops [--wts path/to/mobilenetv2_bottleneck_wts.pt]
+
+Calibration and evaluation crops are directories of recorded detection crops
+(any of .jpg/.png/.bmp); use different recordings for both. Without --crops,
+random crops are used, which says little about real matching quality.
+
+Besides the per crop cosine similarity between fp32 and int8 features, the
+report gives the nearest neighbour agreement: the fraction of crops whose
+nearest other crop (by cosine distance, as used by the tracker's appearance
+metric) is the same with both feature sets.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
+from deep_sort_realtime.embedder.preprocess import load_crops
+
+
+def random_crops(n, rng):
+    return [
+        rng.integers(0, 256, (rng.integers(40, 300), rng.integers(40, 300), 3), dtype=np.uint8)
+        for _ in range(n)
+    ]
+
+
+def throughput(embedder, crops, repeat):
+    embedder.predict(crops)
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        embedder.predict(crops)
+    return repeat * len(crops) / (time.perf_counter() - tic)
+
+
+def normalize(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def nearest_neighbours(feats):
+    similarity = feats @ feats.T
+    np.fill_diagonal(similarity, -np.inf)
+    return similarity.argmax(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wts", default=None, help="mobilenetv2 torch weights")
+    parser.add_argument("--calib", required=True, help="directory of calibration crops")
+    parser.add_argument("--crops", default=None, help="directory of evaluation crops")
+    parser.add_argument("--num-random", type=int, default=64, help="random crops if no --crops")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.95)
+    args = parser.parse_args()
+
+    fp32_embedder = MobileNetv2_Embedder(model_wts_path=args.wts, gpu=False)
+    int8_embedder = MobileNetv2_Embedder(
+        model_wts_path=args.wts, quantize="int8", calibration_crops=args.calib
+    )
+
+    if args.crops is None:
+        crops = random_crops(args.num_random, np.random.default_rng(0))
+    else:
+        crops = load_crops(args.crops)
+    ref = normalize(np.array(fp32_embedder.predict(crops), dtype=np.float64))
+    out = normalize(np.array(int8_embedder.predict(crops), dtype=np.float64))
+    cosine = np.sum(ref * out, axis=1)
+    print(
+        f"cosine similarity over {len(crops)} crops: mean {cosine.mean():.4f}, "
+        f"p1 {np.percentile(cosine, 1):.4f}, min {cosine.min():.4f}"
+    )
+    if len(crops) > 2:
+        agree = nearest_neighbours(ref) == nearest_neighbours(out)
+        print(f"nearest neighbour agreement: {agree.mean():.3f}")
+
+    batch = crops[: fp32_embedder.max_batch_size]
+    for name, embedder in (("fp32", fp32_embedder), ("int8", int8_embedder)):
+        print(f"{name:>5}: {throughput(embedder, batch, args.repeat):8.1f} crops/s")
+
+    if cosine.mean() < args.min_cosine:
+        raise SystemExit(f"mean cosine similarity below {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Parity and throughput of the onnxruntime MobileNetV2 embedder against the
+torch one.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_embedder_onnx [--wts path/to/mobilenetv2_bottleneck_wts.pt]
+
+Exits with an error if the features of both embedders differ by more than the
+tolerance, so it doubles as the parity check for the ONNX export.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.embedder.embedder_onnx import MobileNetv2_ONNX_Embedder
+from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
+
+
+def random_crops(n, rng):
+    return [
+        rng.integers(0, 256, (rng.integers(40, 300), rng.integers(40, 300), 3), dtype=np.uint8)
+        for _ in range(n)
+    ]
+
+
+def throughput(embedder, crops, repeat):
+    embedder.predict(crops)
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        embedder.predict(crops)
+    return repeat * len(crops) / (time.perf_counter() - tic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wts", default=None, help="mobilenetv2 torch weights")
+    parser.add_argument("--crops", type=int, default=32, help="crops per frame")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    torch_embedder = MobileNetv2_Embedder(model_wts_path=args.wts, gpu=False)
+    onnx_embedder = MobileNetv2_ONNX_Embedder(model_wts_path=args.wts)
+
+    crops = random_crops(args.crops, np.random.default_rng(0))
+    ref = np.array(torch_embedder.predict(crops))
+    out = np.array(onnx_embedder.predict(crops))
+    assert out.shape == ref.shape == (len(crops), 1280), out.shape
+    max_diff = np.abs(out - ref).max()
+    cosine = np.sum(out * ref, axis=1) / (
+        np.linalg.norm(out, axis=1) * np.linalg.norm(ref, axis=1)
+    )
+    print(f"parity: max abs diff {max_diff:.2e}, min cosine similarity {cosine.min():.6f}")
+    if max_diff > args.atol:
+        raise SystemExit(f"features differ by more than {args.atol}")
+
+    for name, embedder in (("torch", torch_embedder), ("onnxruntime", onnx_embedder)):
+        print(f"{name:>12}: {throughput(embedder, crops, args.repeat):8.1f} crops/s")
+
+
+if __name__ == "__main__":
+    main()
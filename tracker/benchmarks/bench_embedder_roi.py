@@ -0,0 +1,61 @@
+"""Per frame embedding time of the RoI Align MobileNetV2 embedder against the
+crop based one, for an increasing number of detections.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_embedder_roi [--wts path/to/mobilenetv2_bottleneck_wts.pt]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.deepsort_tracker import DeepSort
+from deep_sort_realtime.embedder.embedder_pytorch import (
+    MobileNetv2_Embedder,
+    MobileNetv2_RoIAlign_Embedder,
+)
+
+
+def random_boxes(n, im_width, im_height, rng):
+    w = rng.uniform(40, 200, n)
+    h = rng.uniform(40, 200, n)
+    l = rng.uniform(0, im_width - w)
+    t = rng.uniform(0, im_height - h)
+    return np.stack([l, t, w, h], axis=1).tolist()
+
+
+def frame_time(fn, repeat):
+    fn()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - tic) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wts", default=None, help="mobilenetv2 torch weights")
+    parser.add_argument("--frame-width", type=int, default=960)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--gpu", action="store_true")
+    args = parser.parse_args()
+
+    crop_embedder = MobileNetv2_Embedder(model_wts_path=args.wts, gpu=args.gpu)
+    roi_embedder = MobileNetv2_RoIAlign_Embedder(
+        model_wts_path=args.wts, gpu=args.gpu, frame_width=args.frame_width
+    )
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    print(f"{'dets':>5} {'crops (s)':>10} {'roi (s)':>10}")
+    for n in (1, 4, 16, 32, 64):
+        boxes = random_boxes(n, frame.shape[1], frame.shape[0], rng)
+        crops, _ = DeepSort.crop_bb(frame, [(box,) for box in boxes])
+        crop_time = frame_time(lambda: crop_embedder.predict(crops), args.repeat)
+        roi_time = frame_time(lambda: roi_embedder.predict(frame, boxes), args.repeat)
+        print(f"{n:>5} {crop_time:>10.3f} {roi_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
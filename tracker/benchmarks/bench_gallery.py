@@ -0,0 +1,87 @@
+"""Appearance cost matrix time and gallery memory of NearestNeighborDistanceMetric
+against the previous per-target implementation (a list of samples per target,
+one distance call per target).
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_gallery
+
+Each scene has --targets targets with --history samples each, plus one long
+lived target with --long-history samples (e.g. a vehicle parked for minutes),
+and is matched against --detections features.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.deep_sort.nn_matching import (
+    NearestNeighborDistanceMetric,
+    _nn_cosine_distance,
+)
+
+
+class ListGallery(object):
+    """The previous implementation: samples appended to a list per target."""
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.samples = {}
+
+    def partial_fit(self, features, targets, active_targets):
+        for feature, target in zip(features, targets):
+            self.samples.setdefault(target, []).append(feature)
+            if self.budget is not None:
+                self.samples[target] = self.samples[target][-self.budget :]
+        self.samples = {k: self.samples[k] for k in active_targets}
+
+    def distance(self, features, targets):
+        cost_matrix = np.zeros((len(targets), len(features)))
+        for i, target in enumerate(targets):
+            cost_matrix[i, :] = _nn_cosine_distance(self.samples[target], features)
+        return cost_matrix
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for samples in self.samples.values() for f in samples)
+
+
+def fill(gallery, n_targets, history, long_history, dim, rng):
+    targets = list(range(n_targets + 1))
+    lengths = [history] * n_targets + [long_history]
+    for step in range(max(lengths)):
+        alive = [t for t, n in zip(targets, lengths) if step < n]
+        features = rng.normal(size=(len(alive), dim)).astype(np.float32)
+        gallery.partial_fit(features, alive, targets)
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=50)
+    parser.add_argument("--history", type=int, default=60)
+    parser.add_argument("--long-history", type=int, default=3000)
+    parser.add_argument("--detections", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=1280)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'budget':>6} {'gallery':>8} {'distance (ms)':>14} {'memory (MB)':>12}")
+    for budget in (None, 100):
+        rng = np.random.default_rng(0)
+        features = rng.normal(size=(args.detections, args.dim)).astype(np.float32)
+        for name, gallery in (
+            ("list", ListGallery(budget)),
+            ("metric", NearestNeighborDistanceMetric("cosine", 0.2, budget)),
+        ):
+            targets = fill(gallery, args.targets, args.history, args.long_history, args.dim, rng)
+            gallery.distance(features, targets)
+            tic = time.perf_counter()
+            for _ in range(args.repeat):
+                gallery.distance(features, targets)
+            elapsed = (time.perf_counter() - tic) / args.repeat
+            print(f"{str(budget):>6} {name:>8} {elapsed * 1e3:>14.1f} {gallery.nbytes / 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
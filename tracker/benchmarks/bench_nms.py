@@ -0,0 +1,112 @@
+"""Benchmark non_max_suppression against the previous np.delete based loop.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_nms
+
+Two kinds of scenes: boxes spread uniformly over a 1920 x 1920 frame, and
+jittered copies of fewer objects in a 1000 x 1000 area, as a detector outputs
+before NMS (dense, most boxes suppressed).
+"""
+import time
+
+import numpy as np
+
+from deep_sort_realtime.utils.nms import non_max_suppression
+
+
+def legacy_non_max_suppression(boxes, max_bbox_overlap, scores=None):
+    """The previous implementation, kept here as the reference."""
+    if len(boxes) == 0:
+        return []
+
+    boxes = boxes.astype(np.float32)
+    pick = []
+
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = boxes[:, 2] + boxes[:, 0]
+    y2 = boxes[:, 3] + boxes[:, 1]
+
+    area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    if scores is not None:
+        idxs = np.argsort(scores)
+    else:
+        idxs = np.argsort(y2)
+
+    while len(idxs) > 0:
+        last = len(idxs) - 1
+        i = idxs[last]
+        pick.append(i)
+
+        xx1 = np.maximum(x1[i], x1[idxs[:last]])
+        yy1 = np.maximum(y1[i], y1[idxs[:last]])
+        xx2 = np.minimum(x2[i], x2[idxs[:last]])
+        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+
+        overlap = (w * h) / area[idxs[:last]]
+
+        idxs = np.delete(
+            idxs, np.concatenate(([last], np.where(overlap > max_bbox_overlap)[0]))
+        )
+
+    return pick
+
+
+def random_boxes(n, rng, frame_size=1920):
+    xy = rng.uniform(0, frame_size, (n, 2))
+    wh = rng.uniform(20, 200, (n, 2))
+    return np.hstack([xy, wh]), rng.uniform(0.3, 1.0, n), rng.integers(0, 2, n)
+
+
+def clustered_boxes(n, rng, area_size=1000):
+    centers = rng.uniform(0, area_size, (max(1, n // 10), 2))
+    sizes = rng.uniform(20, 200, (len(centers), 2))
+    which = rng.integers(0, len(centers), n)
+    wh = sizes[which] * rng.uniform(0.7, 1.3, (n, 2))
+    xy = centers[which] - wh / 2 + rng.normal(0, 10, (n, 2))
+    return np.hstack([xy, wh]), rng.uniform(0.3, 1.0, n), rng.integers(0, 2, n)
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - tic)
+    return best
+
+
+def main(sizes=(50, 500, 5000, 20000), max_bbox_overlap=0.7):
+    rng = np.random.default_rng(0)
+    print(f"{'scene':>9} {'boxes':>6} {'legacy ms':>10} {'nms ms':>10} {'per-class ms':>13} {'speedup':>8}")
+    for scene, make_boxes in (("uniform", random_boxes), ("clustered", clustered_boxes)):
+        for n in sizes:
+            run(scene, n, *make_boxes(n, rng), max_bbox_overlap)
+
+
+def run(scene, n, boxes, scores, classes, max_bbox_overlap):
+    repeat = 20 if n <= 500 else 3
+
+    legacy = legacy_non_max_suppression(boxes, max_bbox_overlap, scores)
+    fast = non_max_suppression(boxes, max_bbox_overlap, scores)
+    assert sorted(legacy) == sorted(fast), "results differ from legacy NMS"
+
+    t_legacy = timeit(
+        lambda: legacy_non_max_suppression(boxes, max_bbox_overlap, scores), repeat
+    )
+    t_fast = timeit(lambda: non_max_suppression(boxes, max_bbox_overlap, scores), repeat)
+    t_class = timeit(
+        lambda: non_max_suppression(boxes, max_bbox_overlap, scores, classes), repeat
+    )
+    print(
+        f"{scene:>9} {n:>6} {t_legacy * 1e3:>10.2f} {t_fast * 1e3:>10.2f} "
+        f"{t_class * 1e3:>13.2f} {t_legacy / t_fast:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Per frame time of building black padded polygon crops (oriented boxes) with
+a frame sized mask per polygon, as before, against rasterizing each polygon in
+its bounding rect only.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_poly_crops
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from deep_sort_realtime.deepsort_tracker import DeepSort
+
+
+def random_oriented_boxes(n, im_width, im_height, rng):
+    centers = rng.uniform([0, 0], [im_width, im_height], (n, 2))
+    sizes = rng.uniform(30, 200, (n, 2))
+    angles = rng.uniform(0, np.pi, n)
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) / 2
+    polygons = []
+    for center, size, angle in zip(centers, sizes, angles):
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        polygons.append(((corners * size) @ rotation.T + center).ravel().tolist())
+    return polygons
+
+
+def full_frame_masks(frame, polygons, bounding_rects):
+    """The previous crop_poly_pad_black."""
+    crops = []
+    im_height, im_width = frame.shape[:2]
+    for polygon, (x, y, w, h) in zip(polygons, bounding_rects):
+        mask = np.zeros(frame.shape, dtype=np.uint8)
+        cv2.fillPoly(mask, np.array([polygon]).astype(int), color=(255, 255, 255))
+        masked_image = cv2.bitwise_and(frame, mask)
+        crops.append(
+            masked_image[max(0, y) : min(im_height, y + h), max(0, x) : min(im_width, x + w)].copy()
+        )
+    return crops
+
+
+def frame_time(fn, repeat):
+    fn()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - tic) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    print(f"{'polygons':>8} {'frame masks (ms)':>17} {'rect masks (ms)':>16}")
+    for n in (1, 10, 30, 60):
+        raw_polygons = random_oriented_boxes(n, frame.shape[1], frame.shape[0], rng)
+        polygons, bounding_rects = DeepSort.process_polygons(raw_polygons)
+        old = frame_time(lambda: full_frame_masks(frame, polygons, bounding_rects), args.repeat)
+        new = frame_time(
+            lambda: DeepSort.crop_poly_pad_black(frame, *DeepSort.process_polygons(raw_polygons)),
+            args.repeat,
+        )
+        print(f"{n:>8} {old * 1e3:>17.2f} {new * 1e3:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold start time of DeepSort, from import to the first tracks, for each
+way of loading the embedder.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.bench_startup [--wts path/to/mobilenetv2_bottleneck_wts.pt]
+
+Every measurement runs in a fresh interpreter, like a restart after a crash.
+Besides constructing DeepSort, the child spends --other-work seconds on the
+rest of the application's startup (loading the detector, opening the camera;
+simulated with a sleep). That work runs after DeepSort is constructed, except
+with the `startup.parallel_startup` orchestrator, which runs both at once.
+Configurations with the TorchScript cache run once untimed to build it. With
+--calib, the embedder is quantized to int8 (calibrated on that directory of
+crops), which is where the cache saves the most.
+
+With --entry-point, the application itself is timed instead: IllegalParking.py
+runs with --exit-after-first-frame on --source (camera index or video file)
+and reports its time to the first handled frame, with the real detector
+(ultralytics and models/yolov8n.pt) and the real camera. It runs once with
+each embedder: the YOLO neck features, and the built-in MobileNetV2 first
+without and then with its TorchScript cache.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+CHILD = """
+import json, sys, time
+tic = time.perf_counter()
+args = json.loads(sys.argv[1])
+kwargs = dict(embedder=args["embedder"], embedder_wts=args["wts"], embedder_gpu=False,
+              lazy_embedder=args["lazy"], embedder_cache=args["cache"])
+if args["calib"] is not None:
+    kwargs.update(embedder_quantize="int8", embedder_calibration=args["calib"])
+if args["parallel"]:
+    from startup import parallel_startup, create_tracker
+    results, _ = parallel_startup({
+        "tracker": lambda: create_tracker(**kwargs),
+        "other": lambda: time.sleep(args["other_work"]),
+    })
+    tracker = results["tracker"]
+else:
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+    tracker = DeepSort(**kwargs)
+    time.sleep(args["other_work"])
+import numpy as np
+frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+tracker.update_tracks([([100, 100, 50, 80], 0.9, "bicycle")], frame=frame)
+print(json.dumps({"first_track": time.perf_counter() - tic}))
+"""
+
+CONFIGS = [
+    # name, lazy_embedder, embedder_cache, parallel_startup
+    ("eager", False, False, False),
+    ("lazy", True, False, False),
+    ("background", "background", False, False),
+    ("eager + cache", False, True, False),
+    ("parallel + cache", False, True, True),
+]
+
+
+def entry_point_first_frame(source, embedder, env):
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "IllegalParking.py", "--source", source,
+         "--embedder", embedder, "--exit-after-first-frame", "--no-display"],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(re.search(r"首帧耗时: ([0-9.]+)", out.stdout).group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wts", default=None, help="embedder weights")
+    parser.add_argument("--embedder", default="mobilenet")
+    parser.add_argument("--calib", default=None, help="calibration crops for an int8 embedder")
+    parser.add_argument("--other-work", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--entry-point", action="store_true", help="time IllegalParking.py itself")
+    parser.add_argument("--source", default="0", help="camera index or video file, with --entry-point")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    if args.entry_point:
+        print(f"{'embedder':>22} {'first frame (s)':>16}")
+        print(f"{'yolo neck':>22} {entry_point_first_frame(args.source, 'yolo', env):>16.3f}")
+        # the first run builds the TorchScript cache, unless an earlier run already did
+        print(f"{'mobilenet, first run':>22} {entry_point_first_frame(args.source, 'mobilenet', env):>16.3f}")
+        best = min(entry_point_first_frame(args.source, "mobilenet", env) for _ in range(args.repeat))
+        print(f"{'mobilenet, cached':>22} {best:>16.3f}")
+        return
+
+    def run(lazy, cache, parallel):
+        child_args = json.dumps(
+            {
+                "embedder": args.embedder,
+                "wts": args.wts,
+                "lazy": lazy,
+                "cache": cache,
+                "parallel": parallel,
+                "calib": args.calib,
+                "other_work": args.other_work,
+            }
+        )
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", CHILD, child_args],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])["first_track"]
+
+    print(f"{'config':>18} {'first track (s)':>16}")
+    for name, lazy, cache, parallel in CONFIGS:
+        if cache:
+            run(lazy, cache, parallel)
+        best = min(run(lazy, cache, parallel) for _ in range(args.repeat))
+        print(f"{name:>18} {best:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
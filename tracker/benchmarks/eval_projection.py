@@ -0,0 +1,119 @@
+"""Appearance matching accuracy of projected features against the embedder's
+own, on a recorded sequence.
+
+Run from the `tracker` directory:
+
+    python -m benchmarks.eval_projection recorded.npz --projection pca128.npy
+    python -m benchmarks.eval_projection recorded.npz --dim 128 [--whiten]
+
+The recording is a .npz with three arrays of length N: `features` (N x D
+embeddings, unprojected), `ids` (identity of each) and `frames` (frame index
+of each). Ground truth boxes make the best ids; the confirmed track ids of a
+tracker run without projection work too (save `get_feature()`, `track_id` and
+the frame index of each track with `time_since_update == 0`).
+
+Frames are replayed in order through the tracker's appearance gallery
+(`NearestNeighborDistanceMetric`, cosine, with --budget samples per id): each
+feature is matched against the ids seen before and then added to its own.
+Reported per representation, over features whose id was seen before:
+
+- rank-1: the nearest id is the right one
+- TAR: the distance to the right id is within the threshold
+- FAR: the distance to some wrong id is within the threshold
+
+With --dim, the projection is fitted on the first --fit-fraction of the frames
+and evaluated on the rest. As projected distances are scaled differently, the
+threshold giving projected features the same TAR as the original ones at
+--max-cosine-distance is reported as well, as a starting point for retuning.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort_realtime.deep_sort.nn_matching import NearestNeighborDistanceMetric
+from deep_sort_realtime.embedder.projection import FeatureProjection, fit_projection
+
+
+def replay(features, ids, frames, budget):
+    """Distances of each feature to its own id and to the nearest other id
+    (inf if none), for features whose id is already in the gallery."""
+    metric = NearestNeighborDistanceMetric("cosine", 1.0, budget)
+    seen = set()
+    own, other, rank1 = [], [], []
+    distance_time = 0.0
+    for frame in np.unique(frames):
+        idx = np.flatnonzero(frames == frame)
+        frame_features, frame_ids = features[idx], ids[idx]
+        known = sorted(seen)
+        if known:
+            tic = time.perf_counter()
+            cost = metric.distance(frame_features, known)
+            distance_time += time.perf_counter() - tic
+            rows = {target: row for row, target in enumerate(known)}
+            for j, target in enumerate(frame_ids):
+                if target not in rows:
+                    continue
+                column = cost[:, j].copy()
+                own.append(column[rows[target]])
+                rank1.append(known[int(np.argmin(column))] == target)
+                column[rows[target]] = np.inf
+                other.append(column.min() if len(known) > 1 else np.inf)
+        seen.update(frame_ids.tolist())
+        metric.partial_fit(frame_features, frame_ids, sorted(seen))
+    return np.array(own), np.array(other), np.array(rank1), distance_time, metric.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help=".npz with features, ids and frames")
+    parser.add_argument("--projection", default=None, help="projection matrix (.npy) to evaluate")
+    parser.add_argument("--dim", type=int, default=128, help="dimensions to fit, without --projection")
+    parser.add_argument("--whiten", action="store_true")
+    parser.add_argument("--fit-fraction", type=float, default=0.5)
+    parser.add_argument("--budget", type=int, default=100)
+    parser.add_argument("--max-cosine-distance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    data = np.load(args.recording)
+    features = np.asarray(data["features"], dtype=np.float32)
+    _, ids = np.unique(data["ids"], return_inverse=True)
+    frames = np.asarray(data["frames"])
+
+    if args.projection is not None:
+        projection = FeatureProjection(args.projection)
+        evaluated = np.ones(len(features), dtype=bool)
+    else:
+        split = np.quantile(np.unique(frames), args.fit_fraction)
+        evaluated = frames > split
+        projection = FeatureProjection(
+            fit_projection(features[~evaluated], dim=args.dim, whiten=args.whiten)
+        )
+        print(f"fitted on {np.count_nonzero(~evaluated)} features (frames <= {split:g})")
+
+    features, ids, frames = features[evaluated], ids[evaluated], frames[evaluated]
+    threshold = args.max_cosine_distance
+    results = {
+        f"original ({projection.in_dim}d)": replay(features, ids, frames, args.budget),
+        f"projected ({projection.out_dim}d)": replay(projection(features), ids, frames, args.budget),
+    }
+
+    print(f"{len(features)} features, {len(np.unique(ids))} ids, {len(np.unique(frames))} frames, threshold {threshold}")
+    print(f"{'':>18} {'rank-1':>7} {'TAR':>7} {'FAR':>7} {'distance (ms)':>14} {'gallery (MB)':>13}")
+    for name, (own, other, rank1, distance_time, gallery_bytes) in results.items():
+        print(
+            f"{name:>18} {rank1.mean():>7.3f} {np.mean(own <= threshold):>7.3f} "
+            f"{np.mean(other <= threshold):>7.3f} {distance_time * 1e3:>14.1f} {gallery_bytes / 1e6:>13.2f}"
+        )
+
+    (own, _, _, _, _), (own_p, other_p, _, _, _) = results.values()
+    tar = np.mean(own <= threshold)
+    matched = np.quantile(own_p, tar) if len(own_p) else float("nan")
+    print(
+        f"projected threshold with the original TAR ({tar:.3f}): {matched:.3f}, "
+        f"FAR there: {np.mean(other_p <= matched):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Puts this directory on sys.path so tests import deep_sort_realtime from the tree.
@@ -20,6 +20,10 @@ class Detection(object):
         Instance mask corresponding to bounding box
     others : Optional any
         Other supplementary fields associated with detection that wants to be stored as a "memory" to be retrieve through the track downstream.
+    feature_reused : Optional bool
+        True if `feature` was not computed for this detection but copied from
+        the track it is expected to match. Such features are not added to the
+        appearance gallery again.
 
     Attributes
     ----------
@@ -29,10 +33,12 @@ class Detection(object):
         Detector confidence score.
     feature : ndarray | NoneType
         A feature vector that describes the object contained in this image.
+    feature_reused : bool
+        True if `feature` was copied from a track instead of computed.
 
     """
 
-    def __init__(self, ltwh, confidence, feature, class_name=None, instance_mask=None, others=None):
+    def __init__(self, ltwh, confidence, feature, class_name=None, instance_mask=None, others=None, feature_reused=False):
         # def __init__(self, ltwh, feature):
         self.ltwh = np.asarray(ltwh, dtype=np.float32)
         self.confidence = float(confidence)
@@ -40,6 +46,7 @@ class Detection(object):
         self.class_name = class_name
         self.instance_mask = instance_mask
         self.others = others
+        self.feature_reused = feature_reused
 
     def get_ltwh(self):
         return self.ltwh.copy()
@@ -23,27 +23,56 @@ def iou(bbox, candidates):
         occluded by the candidate.
 
     """
-    bbox_tl, bbox_br = bbox[:2], bbox[:2] + bbox[2:]
-    candidates_tl = candidates[:, :2]
-    candidates_br = candidates[:, :2] + candidates[:, 2:]
-
-    tl = np.c_[
-        np.maximum(bbox_tl[0], candidates_tl[:, 0])[:, np.newaxis],
-        np.maximum(bbox_tl[1], candidates_tl[:, 1])[:, np.newaxis],
-    ]
-    br = np.c_[
-        np.minimum(bbox_br[0], candidates_br[:, 0])[:, np.newaxis],
-        np.minimum(bbox_br[1], candidates_br[:, 1])[:, np.newaxis],
-    ]
+    return iou_matrix(np.asarray(bbox)[np.newaxis, :], candidates)[0]
+
+
+def iou_matrix(bboxes, candidates):
+    """Compute pair-wise intersection over union in a single broadcast.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format.
+
+    Returns
+    -------
+    ndarray
+        Returns an NxM matrix where element (i, j) is the intersection over
+        union in [0, 1] between `bboxes[i]` and `candidates[j]`.
+
+    """
+    bboxes_tl = bboxes[:, np.newaxis, :2]
+    bboxes_br = bboxes_tl + bboxes[:, np.newaxis, 2:]
+    candidates_tl = candidates[np.newaxis, :, :2]
+    candidates_br = candidates_tl + candidates[np.newaxis, :, 2:]
+
+    tl = np.maximum(bboxes_tl, candidates_tl)
+    br = np.minimum(bboxes_br, candidates_br)
     wh = np.maximum(0.0, br - tl)
 
-    area_intersection = wh.prod(axis=1)
-    area_bbox = bbox[2:].prod()
+    area_intersection = wh.prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)
     area_candidates = candidates[:, 2:].prod(axis=1)
-    return area_intersection / (area_bbox + area_candidates - area_intersection)
+    return area_intersection / (
+        area_bboxes[:, np.newaxis] + area_candidates[np.newaxis, :] - area_intersection
+    )
 
 
-def iou_cost(tracks, detections, track_indices=None, detection_indices=None):
+def xyah_to_ltwh(xyah):
+    """Convert an Nx4 matrix of `(center x, center y, aspect ratio, height)`
+    rows to `(top left x, top left y, width, height)`, as `Track.to_ltwh`
+    does for a single track.
+    """
+    ltwh = np.array(xyah, dtype=float)
+    ltwh[:, 2] *= ltwh[:, 3]
+    ltwh[:, :2] -= ltwh[:, 2:] / 2
+    return ltwh
+
+
+def iou_cost(tracks, detections, track_indices=None, detection_indices=None, store=None):
     """An intersection over union distance metric.
 
     Parameters
@@ -58,6 +87,10 @@ def iou_cost(tracks, detections, track_indices=None, detection_indices=None):
     detection_indices : Optional[List[int]]
         A list of indices to detections that should be matched. Defaults
         to all `detections`.
+    store : Optional[deep_sort.track.TrackStore]
+        The store `tracks` are attached to, such that `tracks[i]` is row `i`.
+        If given, time since update and boxes are read from it in one index
+        instead of track by track.
 
     Returns
     -------
@@ -72,14 +105,18 @@ def iou_cost(tracks, detections, track_indices=None, detection_indices=None):
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    candidates = np.asarray([detections[i].ltwh for i in detection_indices])
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)))
 
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
+    candidates = np.asarray([detections[i].ltwh for i in detection_indices])
+    if store is not None:
+        rows = np.asarray(track_indices)
+        time_since_update = store.time_since_update[rows]
+        bboxes = xyah_to_ltwh(store.mean[rows, :4])
+    else:
+        time_since_update = np.asarray([tracks[i].time_since_update for i in track_indices])
+        bboxes = xyah_to_ltwh([tracks[i].mean[:4] for i in track_indices])
 
-        bbox = tracks[track_idx].to_ltwh()
-        cost_matrix[row, :] = 1.0 - iou(bbox, candidates)
+    cost_matrix = 1.0 - iou_matrix(bboxes, candidates)
+    cost_matrix[time_since_update > 1, :] = linear_assignment.INFTY_COST
     return cost_matrix
@@ -128,6 +128,41 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def predict_batch(self, mean, covariance):
+        """Run Kalman filter prediction step on a stack of state distributions.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of mean vectors of the object states at
+            the previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional stack of covariance matrices of the object
+            states at the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx8 mean matrix and Nx8x8 covariance stack of the
+            predicted states. Equivalent to calling `predict` on each row.
+
+        """
+        height = mean[:, 3]
+        std = np.empty_like(mean)
+        std[:, [0, 1, 3]] = self._std_weight_position * height[:, np.newaxis]
+        std[:, 2] = 1e-2
+        std[:, [4, 5, 7]] = self._std_weight_velocity * height[:, np.newaxis]
+        std[:, 6] = 1e-5
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._motion_mat, covariance), self._motion_mat.T
+        )
+        diag = np.arange(mean.shape[1])
+        covariance[:, diag, diag] += np.square(std)
+
+        return mean, covariance
+
     def project(self, mean, covariance):
         """Project state distribution to measurement space.
 
@@ -159,6 +194,36 @@ class KalmanFilter(object):
         )
         return mean, covariance + innovation_cov
 
+    def project_batch(self, mean, covariance):
+        """Project a stack of state distributions to measurement space.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of state mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional stack of state covariance matrices.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 projected covariance
+            matrices of the given state estimates.
+
+        """
+        height = mean[:, 3]
+        std = np.empty((len(mean), self._update_mat.shape[0]))
+        std[:, [0, 1, 3]] = self._std_weight_position * height[:, np.newaxis]
+        std[:, 2] = 1e-1
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._update_mat, covariance), self._update_mat.T
+        )
+        diag = np.arange(mean.shape[1])
+        covariance[:, diag, diag] += np.square(std)
+        return mean, covariance
+
     def update(self, mean, covariance, measurement):
         """Run Kalman filter correction step.
 
@@ -197,6 +262,41 @@ class KalmanFilter(object):
         )
         return new_mean, new_covariance
 
+    def update_batch(self, mean, covariance, measurement):
+        """Run Kalman filter correction step on a stack of state distributions.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of predicted state mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional stack of state covariance matrices.
+        measurement : ndarray
+            The Nx4 dimensional matrix of measurement vectors (x, y, a, h),
+            where row i is the measurement associated with state i.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions. Equivalent
+            to calling `update` on each row.
+
+        """
+        projected_mean, projected_cov = self.project_batch(mean, covariance)
+
+        # The projected covariance is symmetric, so solving S K^T = (P H^T)^T
+        # gives the transposed Kalman gain for every track in one call.
+        kalman_gain = np.linalg.solve(
+            projected_cov, np.matmul(self._update_mat, covariance)
+        ).transpose(0, 2, 1)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.einsum("nij,nj->ni", kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1)
+        )
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements, only_position=False):
         """Compute gating distance between state distribution and measurements.
 
@@ -238,3 +338,42 @@ class KalmanFilter(object):
         )
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def gating_distance_batch(
+        self, mean, covariance, measurements, only_position=False
+    ):
+        """Compute gating distances between a stack of state distributions and
+        measurements.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of state mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional stack of state covariance matrices.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements, each in
+            format (x, y, a, h) where (x, y) is the bounding box center
+            position, a the aspect ratio, and h the height.
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between (mean[i], covariance[i]) and
+            `measurements[j]`. Row i equals `gating_distance` on state i.
+
+        """
+        mean, covariance = self.project_batch(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariance)
+        d = measurements[np.newaxis, :, :] - mean[:, np.newaxis, :]
+        z = np.linalg.solve(cholesky_factor, d.transpose(0, 2, 1))
+        squared_maha = np.sum(z * z, axis=1)
+        return squared_maha
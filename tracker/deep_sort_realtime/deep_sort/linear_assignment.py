@@ -4,6 +4,8 @@ import numpy as np
 
 # from sklearn.utils.linear_assignment_ import linear_assignment
 from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from . import kalman_filter
 
 
@@ -61,27 +63,78 @@ def min_cost_matching(
 
     cost_matrix = distance_metric(tracks, detections, track_indices, detection_indices)
     cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
-    # indices = linear_assignment(cost_matrix)
-    indices = np.vstack(linear_sum_assignment(cost_matrix)).T
-
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in indices[:, 1]:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in indices[:, 0]:
-            unmatched_tracks.append(track_idx)
-    for row, col in indices:
-        track_idx = track_indices[row]
-        detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
-            unmatched_tracks.append(track_idx)
-            unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
+    rows, cols = _solve_components(cost_matrix <= max_distance, cost_matrix)
+
+    matched_rows = np.zeros(len(track_indices), dtype=bool)
+    matched_cols = np.zeros(len(detection_indices), dtype=bool)
+    matched_rows[rows] = True
+    matched_cols[cols] = True
+
+    order = np.argsort(rows)
+    matches = [
+        (track_indices[row], detection_indices[col])
+        for row, col in zip(rows[order], cols[order])
+    ]
+    unmatched_tracks = [track_indices[row] for row in np.flatnonzero(~matched_rows)]
+    unmatched_detections = [
+        detection_indices[col] for col in np.flatnonzero(~matched_cols)
+    ]
     return matches, unmatched_tracks, unmatched_detections
 
 
+def _solve_components(feasible, cost_matrix):
+    """Solve the assignment problem independently on each connected component
+    of the bipartite graph of feasible entries.
+
+    Entries outside `feasible` never produce a match, so the problem splits
+    into independent blocks. Rows and columns without a feasible entry are
+    dropped, one-to-one pairs are matched directly and only the remaining
+    blocks are handed to the Hungarian solver.
+
+    Parameters
+    ----------
+    feasible : ndarray
+        The NxM boolean matrix of admissible associations.
+    cost_matrix : ndarray
+        The NxM cost matrix.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        Row and column indices of the matched (feasible) entries.
+
+    """
+    row_degree = feasible.sum(axis=1)
+    col_degree = feasible.sum(axis=0)
+    edge_rows, edge_cols = np.nonzero(feasible)
+
+    # 1x1 blocks: the only feasible entry of both its row and its column.
+    single = (row_degree[edge_rows] == 1) & (col_degree[edge_cols] == 1)
+    matched_rows, matched_cols = [edge_rows[single]], [edge_cols[single]]
+
+    edge_rows, edge_cols = edge_rows[~single], edge_cols[~single]
+    if len(edge_rows) > 0:
+        block_rows, edge_rows = np.unique(edge_rows, return_inverse=True)
+        block_cols, edge_cols = np.unique(edge_cols, return_inverse=True)
+        n_rows, n_cols = len(block_rows), len(block_cols)
+        graph = coo_matrix(
+            (np.ones(len(edge_rows)), (edge_rows, n_rows + edge_cols)),
+            shape=(n_rows + n_cols, n_rows + n_cols),
+        )
+        n_components, labels = connected_components(graph, directed=False)
+        row_labels, col_labels = labels[:n_rows], labels[n_rows:]
+        for label in range(n_components):
+            rows = block_rows[row_labels == label]
+            cols = block_cols[col_labels == label]
+            block = cost_matrix[np.ix_(rows, cols)]
+            r, c = linear_sum_assignment(block)
+            keep = feasible[rows[r], cols[c]]
+            matched_rows.append(rows[r[keep]])
+            matched_cols.append(cols[c[keep]])
+
+    return np.concatenate(matched_rows), np.concatenate(matched_cols)
+
+
 def matching_cascade(
     distance_metric,
     max_distance,
@@ -93,6 +146,10 @@ def matching_cascade(
 ):
     """Run matching cascade.
 
+    The cost matrix between all given tracks and detections is computed once;
+    each cascade level then matches a row slice of it. Only levels that
+    contain tracks are visited.
+
     Parameters
     ----------
     distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
@@ -134,25 +191,42 @@ def matching_cascade(
 
     unmatched_detections = detection_indices
     matches = []
-    for level in range(cascade_depth):
-        if len(unmatched_detections) == 0:  # No detections left
-            break
-
-        track_indices_l = [
-            k for k in track_indices if tracks[k].time_since_update == 1 + level
-        ]
-        if len(track_indices_l) == 0:  # Nothing to match at this level
-            continue
-
-        matches_l, _, unmatched_detections = min_cost_matching(
-            distance_metric,
-            max_distance,
-            tracks,
-            detections,
-            track_indices_l,
-            unmatched_detections,
+    if len(track_indices) > 0 and len(detection_indices) > 0:
+        cost_matrix = distance_metric(
+            tracks, detections, track_indices, detection_indices
+        )
+        rows = {k: row for row, k in enumerate(track_indices)}
+        cols = {k: col for col, k in enumerate(detection_indices)}
+
+        def level_metric(tracks, dets, track_indices_l, detection_indices_l):
+            return cost_matrix[
+                np.ix_(
+                    [rows[k] for k in track_indices_l],
+                    [cols[k] for k in detection_indices_l],
+                )
+            ]
+
+        time_since_update = np.array(
+            [tracks[k].time_since_update for k in track_indices]
         )
-        matches += matches_l
+        for level in np.unique(time_since_update):
+            if len(unmatched_detections) == 0:  # No detections left
+                break
+            if not 1 <= level <= cascade_depth:
+                continue
+
+            track_indices_l = [
+                track_indices[i] for i in np.flatnonzero(time_since_update == level)
+            ]
+            matches_l, _, unmatched_detections = min_cost_matching(
+                level_metric,
+                max_distance,
+                tracks,
+                detections,
+                track_indices_l,
+                unmatched_detections,
+            )
+            matches += matches_l
     unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
     return matches, unmatched_tracks, unmatched_detections
 
@@ -166,6 +240,7 @@ def gate_cost_matrix(
     detection_indices,
     gated_cost=INFTY_COST,
     only_position=False,
+    store=None,
 ):
     """Invalidate infeasible entries in cost matrix based on the state
     distributions obtained by Kalman filtering.
@@ -194,6 +269,10 @@ def gate_cost_matrix(
     only_position : Optional[bool]
         If True, only the x, y position of the state distribution is considered
         during gating. Defaults to False.
+    store : Optional[track.TrackStore]
+        The store `tracks` are attached to, such that `tracks[i]` is row `i`.
+        If given, the state distributions are read from it in one index
+        instead of track by track.
 
     Returns
     -------
@@ -203,11 +282,15 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
     measurements = np.asarray([detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position
-        )
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+    if store is not None:
+        rows = np.asarray(track_indices)
+        mean, covariance = store.mean[rows], store.covariance[rows]
+    else:
+        mean = np.asarray([tracks[i].mean for i in track_indices])
+        covariance = np.asarray([tracks[i].covariance for i in track_indices])
+    gating_distance = kf.gating_distance_batch(mean, covariance, measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
     return cost_matrix
@@ -96,11 +96,58 @@ def _nn_cosine_distance(x, y):
     return distances.min(axis=0)
 
 
+def _normalize(x):
+    """Scale the rows of `x` to unit length (zero rows are left as they are)."""
+    norm = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norm, np.finfo(x.dtype).tiny)
+
+
+class _SampleBuffer(object):
+    """Samples of one target: a float32 ring buffer (with the squared norms
+    of its rows) that grows by doubling until it reaches the budget."""
+
+    __slots__ = ("data", "sq_norms", "count", "cursor")
+
+    def __init__(self, capacity, dim):
+        self.data = np.empty((capacity, dim), dtype=np.float32)
+        self.sq_norms = np.empty(capacity, dtype=np.float32)
+        self.count = 0
+        self.cursor = 0
+
+    def append(self, feature, sq_norm, budget):
+        capacity = len(self.data)
+        if self.cursor == capacity and (budget is None or capacity < budget):
+            new_capacity = 2 * capacity if budget is None else min(2 * capacity, budget)
+            data = np.empty((new_capacity,) + self.data.shape[1:], dtype=np.float32)
+            data[:capacity] = self.data
+            sq_norms = np.empty(new_capacity, dtype=np.float32)
+            sq_norms[:capacity] = self.sq_norms
+            self.data, self.sq_norms = data, sq_norms
+        elif self.cursor == capacity:
+            # Budget reached: overwrite the oldest sample.
+            self.cursor = 0
+        self.data[self.cursor] = feature
+        self.sq_norms[self.cursor] = sq_norm
+        self.cursor += 1
+        self.count = max(self.count, self.cursor)
+
+
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    Every target keeps its samples in its own float32 ring buffer with a
+    write cursor. Buffers grow by doubling up to the budget (without a budget,
+    indefinitely), so memory stays within twice the number of samples
+    actually held, and a target's buffer is dropped when it leaves the scene.
+    For the cosine metric samples are normalized when inserted.
+
+    `distance` gathers the samples of the requested targets into one
+    contiguous block, computes all distances with a single matrix product and
+    reduces them to a per-target minimum with a segmented min
+    (`np.minimum.reduceat` over the target offsets).
+
     Parameters
     ----------
     metric : str
@@ -114,23 +161,45 @@ class NearestNeighborDistanceMetric(object):
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that
+        have been observed so far (views into the buffers, in no particular
+        order).
+    nbytes : int
+        Memory allocated for the samples of all targets, in bytes.
 
     """
 
+    # Initial buffer length of a target, doubled as samples are added.
+    _initial_capacity = 8
+
     def __init__(self, metric, matching_threshold, budget=None):
 
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+        if metric not in ("euclidean", "cosine"):
             raise ValueError("Invalid metric; must be either 'euclidean' or 'cosine'")
+        self._metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        self._buffers = {}
+
+    @property
+    def samples(self):
+        """Dict[int -> ndarray]: the stored samples of each target, oldest
+        first until the budget wraps around (normalized for the cosine
+        metric). Views into the gallery, not copies."""
+        return {
+            target: buffer.data[: buffer.count]
+            for target, buffer in self._buffers.items()
+        }
+
+    @property
+    def nbytes(self):
+        """int: memory held by the gallery, in bytes."""
+        return sum(
+            buffer.data.nbytes + buffer.sq_norms.nbytes
+            for buffer in self._buffers.values()
+        )
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -145,11 +214,27 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget :]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        active_targets = set(active_targets)
+        for target in [t for t in self._buffers if t not in active_targets]:
+            del self._buffers[target]
+
+        if len(features) == 0:
+            return
+        features = np.asarray(features, dtype=np.float32)
+        if self._metric == "cosine":
+            features = _normalize(features)
+        sq_norms = np.square(features).sum(axis=1)
+
+        for feature, sq_norm, target in zip(features, sq_norms, targets):
+            if target not in active_targets:
+                continue
+            buffer = self._buffers.get(target)
+            if buffer is None:
+                capacity = self._initial_capacity
+                if self.budget is not None:
+                    capacity = min(capacity, self.budget)
+                buffer = self._buffers[target] = _SampleBuffer(capacity, len(feature))
+            buffer.append(feature, sq_norm, self.budget)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -169,7 +254,24 @@ class NearestNeighborDistanceMetric(object):
             `targets[i]` and `features[j]`.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+
+        buffers = [self._buffers[target] for target in targets]
+        counts = np.array([buffer.count for buffer in buffers])
+        offsets = np.zeros(len(buffers), dtype=int)
+        np.cumsum(counts[:-1], out=offsets[1:])
+        gallery = np.concatenate([buffer.data[: buffer.count] for buffer in buffers])
+
+        features = np.asarray(features, dtype=np.float32)
+        if self._metric == "cosine":
+            distances = 1.0 - np.dot(gallery, _normalize(features).T)
+        else:
+            distances = -2.0 * np.dot(gallery, features.T)
+            distances += np.concatenate(
+                [buffer.sq_norms[: buffer.count] for buffer in buffers]
+            )[:, np.newaxis]
+            distances += np.square(features).sum(axis=1)[np.newaxis, :]
+            np.maximum(distances, 0.0, out=distances)
+
+        return np.minimum.reduceat(distances, offsets, axis=0).astype(np.float64)
@@ -1,4 +1,7 @@
 # vim: expandtab:ts=4:sw=4
+import numpy as np
+
+
 class TrackState:
     """
     Enumeration type for the single target track state. Newly created tracks are
@@ -14,6 +17,102 @@ class TrackState:
     Deleted = 3
 
 
+class TrackStore:
+    """
+    Contiguous struct-of-arrays storage for the numeric state of a set of
+    tracks. Row `i` holds the Kalman state and counters of one track, so batch
+    operations can run on slices such as `mean[:len(store)]` instead of
+    gathering per-track arrays. Arrays are preallocated and grow by doubling.
+
+    Parameters
+    ----------
+    capacity : Optional[int]
+        Number of rows to preallocate. Defaults to 32.
+    ndim : Optional[int]
+        Dimensionality of the state space. Defaults to 8.
+
+    Attributes
+    ----------
+    mean : ndarray
+        The capacity x ndim matrix of state mean vectors, float64 whatever the
+        dtype of the measurements.
+    covariance : ndarray
+        The capacity x ndim x ndim stack of state covariance matrices, float64.
+    hits : ndarray
+        Total number of measurement updates per track.
+    age : ndarray
+        Total number of frames since first occurrence per track.
+    time_since_update : ndarray
+        Total number of frames since last measurement update per track.
+    state : ndarray
+        The `TrackState` of each track.
+
+    """
+
+    _fields = ("mean", "covariance", "hits", "age", "time_since_update", "state")
+
+    def __init__(self, capacity=32, ndim=8):
+        capacity = max(1, capacity)
+        self.mean = np.zeros((capacity, ndim))
+        self.covariance = np.zeros((capacity, ndim, ndim))
+        self.hits = np.zeros(capacity, dtype=int)
+        self.age = np.zeros(capacity, dtype=int)
+        self.time_since_update = np.zeros(capacity, dtype=int)
+        self.state = np.zeros(capacity, dtype=int)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self.mean)
+
+    def append(self):
+        """Reserve the next free row, growing the arrays if necessary, and
+        return its index."""
+        if self._size == self.capacity:
+            for field in self._fields:
+                old = getattr(self, field)
+                new = np.zeros((2 * len(old),) + old.shape[1:], dtype=old.dtype)
+                new[: len(old)] = old
+                setattr(self, field, new)
+        self._size += 1
+        return self._size - 1
+
+    def compact(self, keep):
+        """Drop rows in place, preserving the order of the remaining ones.
+
+        Parameters
+        ----------
+        keep : array_like
+            Boolean mask of length `len(self)`; rows where it is False are
+            removed and the remaining rows are moved to the front.
+
+        """
+        keep = np.asarray(keep, dtype=bool)
+        n_keep = int(keep.sum())
+        for field in self._fields:
+            array = getattr(self, field)
+            array[:n_keep] = array[: self._size][keep]
+        self._size = n_keep
+
+    def clear(self):
+        """Remove all rows without releasing the allocated memory."""
+        self._size = 0
+
+
+def _row_property(field, cast=None):
+    def fget(self):
+        value = getattr(self._store, field)[self._row]
+        return value if cast is None else cast(value)
+
+    def fset(self, value):
+        getattr(self._store, field)[self._row] = value
+
+    return property(fget, fset)
+
+
 class Track:
     """
     A single target track with state space `(x, y, a, h)` and associated
@@ -52,9 +151,14 @@ class Track:
     Attributes
     ----------
     mean : ndarray
-        Mean vector of the initial state distribution.
+        Mean vector of the current state distribution. This is a view into the
+        track's row of its `TrackStore`; assigning to it writes into the store.
+        It is float64 from the start, so `to_tlwh` and the other box getters
+        return float64 boxes for tracks created in the current frame too (they
+        used to keep the detection's float32 until the next prediction).
     covariance : ndarray
-        Covariance matrix of the initial state distribution.
+        Covariance matrix of the current state distribution, also a view into
+        the store.
     track_id : int
         A unique track identifier.
     hits : int
@@ -67,10 +171,22 @@ class Track:
         The current track state.
     features : List[ndarray]
         A cache of features. On each measurement update, the associated feature
-        vector is added to this list.
+        vector is added to this list, unless it was reused from this track. The
+        tracker empties it when the features are added to its distance metric.
+    latest_feature : ndarray | NoneType
+        The most recently computed feature of this track.
+    feature_ltwh : ndarray | NoneType
+        Bounding box of the detection `latest_feature` was computed on.
 
     """
 
+    mean = _row_property("mean")
+    covariance = _row_property("covariance")
+    hits = _row_property("hits", int)
+    age = _row_property("age", int)
+    time_since_update = _row_property("time_since_update", int)
+    state = _row_property("state", int)
+
     def __init__(
         self,
         mean,
@@ -85,6 +201,10 @@ class Track:
         instance_mask=None,
         others=None,
     ):
+        # A track owns a single-row store until a Tracker attaches it to its
+        # shared one.
+        self._store = TrackStore(capacity=1, ndim=len(mean))
+        self._row = self._store.append()
         self.mean = mean
         self.covariance = covariance
         self.track_id = track_id
@@ -96,6 +216,9 @@ class Track:
         self.features = []
         if feature is not None:
             self.features.append(feature)
+        self.latest_feature = feature
+        self.feature_ltwh = original_ltwh
+        self._feature_age = self.age
 
         self._n_init = n_init
         self._max_age = max_age
@@ -106,6 +229,27 @@ class Track:
         self.instance_mask = instance_mask
         self.others = others
 
+    def attach(self, store):
+        """Move this track's state into a new row of `store`.
+
+        Parameters
+        ----------
+        store : TrackStore
+            The store the track state is copied to. Subsequent reads and writes
+            of the track state go to that row.
+
+        """
+        old_store, old_row = self._store, self._row
+        row = store.append()
+        for field in TrackStore._fields:
+            getattr(store, field)[row] = getattr(old_store, field)[old_row]
+        self._store, self._row = store, row
+
+    def detach(self):
+        """Copy this track's state into a private store, so that it stays valid
+        after the row is reused in the shared store (e.g. for deleted tracks)."""
+        self.attach(TrackStore(capacity=1, ndim=self._store.mean.shape[1]))
+
     def to_tlwh(self, orig=False, orig_strict=False):
         """Get current position in bounding box format `(top left x, top left y,
         width, height)`. This function is POORLY NAMED. But we are keeping the way it works the way it works in order not to break any older libraries that depend on this.
@@ -209,7 +353,12 @@ class Track:
         '''
         Get latest appearance feature
         '''
-        return self.features[-1]
+        return self.latest_feature
+
+    @property
+    def frames_since_feature(self):
+        """Number of frames since `latest_feature` was computed."""
+        return self.age - self._feature_age
 
     def predict(self, kf):
         """Propagate the state distribution to the current time step using a
@@ -222,8 +371,22 @@ class Track:
 
         """
         self.mean, self.covariance = kf.predict(self.mean, self.covariance)
+        self.increment_age()
+
+    def increment_age(self):
+        """Advance the track bookkeeping by one time step and clear the
+        detection associated with the previous one. Does not touch the Kalman
+        state.
+        """
         self.age += 1
         self.time_since_update += 1
+        self.clear_detection()
+
+    def clear_detection(self):
+        """Forget the detection associated at the previous time step. The
+        tracker calls this directly after advancing the age counters of all
+        tracks in its store at once.
+        """
         self.original_ltwh = None
         self.det_conf = None
         self.instance_mask = None
@@ -241,11 +404,28 @@ class Track:
             The associated detection.
 
         """
-        self.original_ltwh = detection.get_ltwh()
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah()
         )
-        self.features.append(detection.feature)
+        self.mark_hit(detection)
+
+    def mark_hit(self, detection):
+        """Store the associated detection and update the feature cache and
+        track state. Does not touch the Kalman state; the tracker runs the
+        correction step for all matched tracks at once.
+
+        Parameters
+        ----------
+        detection : Detection
+            The associated detection.
+
+        """
+        self.original_ltwh = detection.get_ltwh()
+        if not detection.feature_reused:
+            self.features.append(detection.feature)
+            self.latest_feature = detection.feature
+            self.feature_ltwh = self.original_ltwh
+            self._feature_age = self.age
         self.det_conf = detection.confidence
         self.det_class = detection.class_name
         self.instance_mask = detection.instance_mask
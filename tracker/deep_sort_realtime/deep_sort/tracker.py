@@ -5,7 +5,12 @@ import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
-from .track import Track
+from .track import Track, TrackState, TrackStore
+
+# Track methods the batched steps of the tracker bypass by working on the
+# TrackStore directly; a track class overriding any of them is stepped per
+# track instead.
+_BATCHED_TRACK_METHODS = ("predict", "update", "is_confirmed", "is_deleted")
 
 
 class Tracker:
@@ -22,8 +27,20 @@ class Tracker:
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    override_track_class : Optional[type]
+        Track class to use instead of `Track`, must inherit it. Tracks of all
+        classes keep their state in the tracker's `TrackStore`, and are
+        predicted, updated and queried for their state in one batch. If the
+        class overrides `predict`, `update`, `is_confirmed` or `is_deleted`,
+        those are called per track instead, as before the store, which is
+        slower with many tracks.
     today: Optional[datetime.date]
             Provide today's date, for naming of tracks
+    keep_last_feature : Optional[bool]
+        If True (default), the latest feature of a confirmed track stays in its
+        feature cache after being added to the metric, and is added again on
+        the next update. If False, the cache is emptied, so only features that
+        were computed for a detection reach the metric.
 
     Attributes
     ----------
@@ -37,6 +54,8 @@ class Tracker:
         A Kalman filter to filter target trajectories in image space.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    store : TrackStore
+        Contiguous state of the active tracks; row `i` belongs to `tracks[i]`.
     gating_only_position : Optional[bool]
         Used during gating, comparing KF predicted and measured states. If True, only the x, y position of the state distribution is considered during gating. Defaults to False, where x,y, aspect ratio and height will be considered.
     """
@@ -50,6 +69,7 @@ class Tracker:
         override_track_class=None,
         today=None,
         gating_only_position=False,
+        keep_last_feature=True,
     ):
         self.today = today
         self.metric = metric
@@ -57,23 +77,42 @@ class Tracker:
         self.max_age = max_age
         self.n_init = n_init
         self.gating_only_position = gating_only_position
+        self.keep_last_feature = keep_last_feature
 
         self.kf = kalman_filter.KalmanFilter()
         self.tracks = []
+        self.store = TrackStore()
         self.del_tracks_ids = []
         self._next_id = 1
         if override_track_class:
             self.track_class = override_track_class
         else:
             self.track_class = Track
+        self._per_track = any(
+            getattr(self.track_class, name) is not getattr(Track, name)
+            for name in _BATCHED_TRACK_METHODS
+        )
 
     def predict(self):
         """Propagate track state distributions one time step forward.
 
         This function should be called once every time step, before `update`.
         """
+        if self._per_track:
+            for track in self.tracks:
+                track.predict(self.kf)
+            return
+        n = len(self.store)
+        if n == 0:
+            return
+        store = self.store
+        store.mean[:n], store.covariance[:n] = self.kf.predict_batch(
+            store.mean[:n], store.covariance[:n]
+        )
+        store.age[:n] += 1
+        store.time_since_update[:n] += 1
         for track in self.tracks:
-            track.predict(self.kf)
+            track.clear_detection()
 
     def update(self, detections, today=None):
         """Perform measurement update and track management.
@@ -97,20 +136,24 @@ class Tracker:
         matches, unmatched_tracks, unmatched_detections = self._match(detections)
 
         # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(self.kf, detections[detection_idx])
+        if self._per_track:
+            for track_idx, detection_idx in matches:
+                self.tracks[track_idx].update(self.kf, detections[detection_idx])
+        elif len(matches) > 0:
+            store = self.store
+            rows = np.asarray([i for i, _ in matches])
+            store.mean[rows], store.covariance[rows] = self.kf.update_batch(
+                store.mean[rows],
+                store.covariance[rows],
+                np.asarray([detections[j].to_xyah() for _, j in matches]),
+            )
+            for track_idx, detection_idx in matches:
+                self.tracks[track_idx].mark_hit(detections[detection_idx])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
             self._initiate_track(detections[detection_idx])
-        new_tracks = []
-        self.del_tracks_ids = []
-        for t in self.tracks:
-            if not t.is_deleted():
-                new_tracks.append(t)
-            else:
-                self.del_tracks_ids.append(t.track_id)
-        self.tracks = new_tracks
+        self._remove_deleted_tracks()
         # self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -121,29 +164,113 @@ class Tracker:
                 continue
             features += track.features
             targets += [track.track_id for _ in track.features]
-            track.features = [track.features[-1]]
+            if self.keep_last_feature and track.features:
+                track.features = [track.features[-1]]
+            else:
+                track.features = []
         self.metric.partial_fit(
             np.asarray(features), np.asarray(targets), active_targets
         )
 
+    def unambiguous_candidates(self, ltwh):
+        """Find, for each detection box, the single track it can be associated
+        with, if that association is unambiguous.
+
+        A detection is unambiguous if exactly one track passes the motion gate
+        for it, that track gates no other detection, was updated at the
+        previous time step and overlaps the detection with an IoU distance of
+        at most `max_iou_distance`. Must be called after `predict`.
+
+        Parameters
+        ----------
+        ltwh : ndarray
+            An Nx4 matrix of detection boxes in format `(top left x, top left
+            y, width, height)`.
+
+        Returns
+        -------
+        ndarray
+            An array of length N holding, for each detection, the index into
+            `tracks` of its unambiguous track, or -1.
+
+        """
+        ltwh = np.asarray(ltwh, dtype=float).reshape(-1, 4)
+        candidates = np.full(len(ltwh), -1)
+        n = len(self.store)
+        if n == 0 or len(ltwh) == 0:
+            return candidates
+
+        store = self.store
+        xyah = ltwh.copy()
+        xyah[:, :2] += xyah[:, 2:] / 2
+        xyah[:, 2] /= xyah[:, 3]
+        gating_dim = 2 if self.gating_only_position else 4
+        feasible = self.kf.gating_distance_batch(
+            store.mean[:n], store.covariance[:n], xyah, self.gating_only_position
+        ) <= kalman_filter.chi2inv95[gating_dim]
+
+        unique = feasible & (feasible.sum(axis=0, keepdims=True) == 1)
+        unique &= feasible.sum(axis=1, keepdims=True) == 1
+        unique &= store.time_since_update[:n, np.newaxis] == 1
+        iou_distance = 1.0 - iou_matching.iou_matrix(
+            iou_matching.xyah_to_ltwh(store.mean[:n, :4]), ltwh
+        )
+        unique &= iou_distance <= self.max_iou_distance
+
+        rows, cols = np.nonzero(unique)
+        candidates[cols] = rows
+        return candidates
+
+    def _remove_deleted_tracks(self):
+        if self._per_track:
+            keep = np.array([not t.is_deleted() for t in self.tracks], dtype=bool)
+        else:
+            keep = self.store.state[: len(self.store)] != TrackState.Deleted
+        new_tracks = []
+        self.del_tracks_ids = []
+        for t, k in zip(self.tracks, keep):
+            if k:
+                new_tracks.append(t)
+            else:
+                self.del_tracks_ids.append(t.track_id)
+                t.detach()
+        if len(new_tracks) < len(self.tracks):
+            self.store.compact(keep)
+            for row, t in enumerate(new_tracks):
+                t._row = row
+        self.tracks = new_tracks
+
     def _match(self, detections):
         def gated_metric(tracks, dets, track_indices, detection_indices):
             features = np.array([dets[i].feature for i in detection_indices])
             targets = np.array([tracks[i].track_id for i in track_indices])
             cost_matrix = self.metric.distance(features, targets)
             cost_matrix = linear_assignment.gate_cost_matrix(
-                self.kf, cost_matrix, tracks, dets, track_indices, detection_indices, only_position=self.gating_only_position
+                self.kf,
+                cost_matrix,
+                tracks,
+                dets,
+                track_indices,
+                detection_indices,
+                only_position=self.gating_only_position,
+                store=self.store,
             )
 
             return cost_matrix
 
+        def iou_metric(tracks, dets, track_indices, detection_indices):
+            return iou_matching.iou_cost(tracks, dets, track_indices, detection_indices, store=self.store)
+
         # Split track set into confirmed and unconfirmed tracks.
-        confirmed_tracks = [i for i, t in enumerate(self.tracks) if t.is_confirmed()]
-        unconfirmed_tracks = [
-            i for i, t in enumerate(self.tracks) if not t.is_confirmed()
-        ]
+        if self._per_track:
+            is_confirmed = np.array([t.is_confirmed() for t in self.tracks], dtype=bool)
+        else:
+            is_confirmed = self.store.state[: len(self.store)] == TrackState.Confirmed
+        confirmed_tracks = np.flatnonzero(is_confirmed).tolist()
+        unconfirmed_tracks = np.flatnonzero(~is_confirmed).tolist()
 
-        # Associate confirmed tracks using appearance features.
+        # Associate confirmed tracks using appearance features. The gated
+        # metric runs once for all confirmed tracks; the cascade slices it.
         (
             matches_a,
             unmatched_tracks_a,
@@ -169,7 +296,7 @@ class Tracker:
             unmatched_tracks_b,
             unmatched_detections,
         ) = linear_assignment.min_cost_matching(
-            iou_matching.iou_cost,
+            iou_metric,
             self.max_iou_distance,
             self.tracks,
             detections,
@@ -188,24 +315,27 @@ class Tracker:
             track_id = "{}_{}".format(self.today, self._next_id)
         else:
             track_id = "{}".format(self._next_id)
-        self.tracks.append(
-            self.track_class(
-                mean,
-                covariance,
-                track_id,
-                self.n_init,
-                self.max_age,
-                # mean, covariance, self._next_id, self.n_init, self.max_age,
-                feature=detection.feature,
-                original_ltwh=detection.get_ltwh(),
-                det_class=detection.class_name,
-                det_conf=detection.confidence,
-                instance_mask=detection.instance_mask,
-                others=detection.others,
-            )
+        track = self.track_class(
+            mean,
+            covariance,
+            track_id,
+            self.n_init,
+            self.max_age,
+            # mean, covariance, self._next_id, self.n_init, self.max_age,
+            feature=detection.feature,
+            original_ltwh=detection.get_ltwh(),
+            det_class=detection.class_name,
+            det_conf=detection.confidence,
+            instance_mask=detection.instance_mask,
+            others=detection.others,
         )
+        track.attach(self.store)
+        self.tracks.append(track)
         self._next_id += 1
 
     def delete_all_tracks(self):
+        for track in self.tracks:
+            track.detach()
         self.tracks = []
+        self.store.clear()
         self._next_id = 1
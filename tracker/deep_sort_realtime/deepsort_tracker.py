@@ -1,19 +1,24 @@
 import time
 import logging
+import functools
+import threading
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 
-import cv2
 import numpy as np
 
-from deep_sort_realtime.deep_sort import nn_matching
+from deep_sort_realtime.deep_sort import iou_matching, nn_matching
 from deep_sort_realtime.deep_sort.detection import Detection
 from deep_sort_realtime.deep_sort.tracker import Tracker
+from deep_sort_realtime.utils.masks import crop_mask
 from deep_sort_realtime.utils.nms import non_max_suppression
 
 logger = logging.getLogger(__name__)
 
 EMBEDDER_CHOICES = [
     "mobilenet",
+    "mobilenet_onnx",
+    "mobilenet_roi",
     "torchreid",
     "clip_RN50",
     "clip_RN101",
@@ -43,6 +48,16 @@ class DeepSort(object):
         embedder_wts=None,
         polygon=False,
         today=None,
+        nms_per_class=False,
+        lazy_embedding=False,
+        embedder_quantize=None,
+        embedder_calibration=None,
+        refresh_interval=None,
+        refresh_max_speed=1.0,
+        refresh_max_iou_distance=0.1,
+        lazy_embedder=False,
+        embedder_cache=False,
+        embedder_projection=None,
     ):
         """
 
@@ -64,26 +79,47 @@ class DeepSort(object):
         gating_only_position : Optional[bool]
             Used during gating, comparing KF predicted and measured states. If True, only the x, y position of the state distribution is considered during gating. Defaults to False, where x,y, aspect ratio and height will be considered.
         override_track_class : Optional[object] = None
-            Giving this will override default Track class, this must inherit Track. Argument for deep_sort_realtime.deep_sort.tracker.Tracker.
+            Giving this will override default Track class, this must inherit Track. Argument for deep_sort_realtime.deep_sort.tracker.Tracker. Tracks are predicted and updated in one batch on the tracker's TrackStore, unless the class overrides Track's predict, update, is_confirmed or is_deleted, which are then called per track (slower with many tracks).
         embedder : Optional[str] = 'mobilenet'
             Whether to use in-built embedder or not. If None, then embeddings must be given during update.
-            Choice of ['mobilenet', 'torchreid', 'clip_RN50', 'clip_RN101', 'clip_RN50x4', 'clip_RN50x16', 'clip_ViT-B/32', 'clip_ViT-B/16']
+            Choice of ['mobilenet', 'mobilenet_onnx', 'mobilenet_roi', 'torchreid', 'clip_RN50', 'clip_RN101', 'clip_RN50x4', 'clip_RN50x16', 'clip_ViT-B/32', 'clip_ViT-B/16']
         half : Optional[bool] = True
-            Whether to use half precision for deep embedder (applicable for mobilenet only)
+            Whether to use half precision for deep embedder (applicable for mobilenet and mobilenet_roi only)
         bgr : Optional[bool] = True
             Whether frame given to embedder is expected to be BGR or not (RGB)
         embedder_gpu: Optional[bool] = True
-            Whether embedder uses gpu or not
+            Whether embedder uses gpu or not ('mobilenet_onnx' always runs on cpu)
         embedder_model_name: Optional[str] = None
             Only used when embedder=='torchreid'. This provides which model to use within torchreid library. Check out torchreid's model zoo.
         embedder_wts: Optional[str] = None
-            Optional specification of path to embedder's model weights. Will default to looking for weights in `deep_sort_realtime/embedder/weights`. If deep_sort_realtime is installed as a package and CLIP models is used as embedder, best to provide path.
+            Optional specification of path to embedder's model weights. Will default to looking for weights in `deep_sort_realtime/embedder/weights`. For 'mobilenet_onnx' these are the torch weights; the exported ONNX model is cached next to them. 'mobilenet_roi' uses the same weights as 'mobilenet', but runs the network once on the full frame and pools a feature per box (instance masks are not applied). If deep_sort_realtime is installed as a package and CLIP models is used as embedder, best to provide path.
         polygon: Optional[bool] = False
             Whether detections are polygons (e.g. oriented bounding boxes)
         today: Optional[datetime.date]
             Provide today's date, for naming of tracks. Argument for deep_sort_realtime.deep_sort.tracker.Tracker.
+        nms_per_class: Optional[bool] = False
+            Whether non-maxima suppression is done per detection class, so that e.g. a bicycle never suppresses an overlapping motorcycle. Only relevant when nms_max_overlap < 1.0.
+        lazy_embedding: Optional[bool] = False
+            If True, the in-built embedder only runs on detections whose association is ambiguous (more than one feasible track by motion gating, no IoU match, or a new track). Unambiguous detections reuse the latest feature of their track. Only applies to horizontal bb detections.
+        embedder_quantize: Optional[str] = None
+            Only used when embedder=='mobilenet'. If "int8", the embedder is quantized to int8 (post-training static quantization) and runs on cpu.
+        embedder_calibration: Optional[str or list] = None
+            Calibration crops for embedder_quantize, a directory of recorded crop images or a list of image paths / ndarrays.
+        refresh_interval: Optional[int] = None
+            If given, stationary tracks (e.g. parked vehicles) reuse their latest feature instead of being embedded again, for at most this many frames. A detection is stationary if it has an unambiguous track (as in lazy_embedding) whose Kalman velocity is at most refresh_max_speed and whose box at its latest feature overlaps the detection with an IoU distance of at most refresh_max_iou_distance. With lazy_embedding, it bounds how long unambiguous detections reuse features. Reused features are not added to the appearance gallery. Only applies to horizontal bb detections.
+        refresh_max_speed: Optional[float] = 1.0
+            Maximum speed of the box center, in pixels per frame, for a track to count as stationary. See refresh_interval.
+        refresh_max_iou_distance: Optional[float] = 0.1
+            Maximum IoU distance between a detection and the box its track's latest feature was computed on, for the track to count as stationary. See refresh_interval.
+        lazy_embedder: Optional[bool or str] = False
+            Defers loading the in-built embedder to shorten startup. If True, it is loaded (and warmed up) when first needed. If "background", loading starts on a background thread right away and the first use waits for it to finish; errors while loading are raised then.
+        embedder_cache: Optional[bool] = False
+            Only used when embedder=='mobilenet'. If True, the prepared embedder model is saved as TorchScript next to its weights, and later starts load it from there (skipping batch norm folding, or int8 calibration with embedder_quantize).
+        embedder_projection: Optional[str or np.ndarray] = None
+            Projection matrix (path to .npy, or the array) fitted on recorded features of the embedder in use with `python -m deep_sort_realtime.embedder.projection`. If given, appearance features (computed, or given as embeds) are projected with it before they reach detections and the appearance gallery, e.g. from 1280 to 128 dims, which shrinks the gallery and the cost of the distance matrix accordingly. Projected features have a different cosine distance distribution, so max_cosine_distance may need retuning (see benchmarks/eval_projection.py).
         """
         self.nms_max_overlap = nms_max_overlap
+        self.nms_per_class = nms_per_class
         metric = nn_matching.NearestNeighborDistanceMetric(
             "cosine", max_cosine_distance, nn_budget
         )
@@ -95,63 +131,161 @@ class DeepSort(object):
             override_track_class=override_track_class,
             today=today,
             gating_only_position=gating_only_position,
+            # reused features must not be re-added to the gallery every frame
+            keep_last_feature=refresh_interval is None,
         )
 
+        if embedder is not None and embedder not in EMBEDDER_CHOICES:
+            raise Exception(f"Embedder {embedder} is not a valid choice.")
+        self._embedder = None
+        self._embedder_loader = None
+        self._embedder_lock = threading.Lock()
         if embedder is not None:
-            if embedder not in EMBEDDER_CHOICES:
-                raise Exception(f"Embedder {embedder} is not a valid choice.")
-            if embedder == "mobilenet":
-                from deep_sort_realtime.embedder.embedder_pytorch import (
-                    MobileNetv2_Embedder as Embedder,
-                )
-
-                self.embedder = Embedder(
-                    half=half,
-                    max_batch_size=16,
-                    bgr=bgr,
-                    gpu=embedder_gpu,
-                    model_wts_path=embedder_wts,
-                )
-            elif embedder == 'torchreid':
-                from deep_sort_realtime.embedder.embedder_pytorch import TorchReID_Embedder as Embedder
-
-                self.embedder = Embedder(
-                    bgr=bgr, 
-                    gpu=embedder_gpu,
-                    model_name=embedder_model_name,
-                    model_wts_path=embedder_wts,
-                )
-
-            elif embedder.startswith('clip_'):
-                from deep_sort_realtime.embedder.embedder_clip import (
-                    Clip_Embedder as Embedder,
-                )
-
-                model_name = "_".join(embedder.split("_")[1:])
-                self.embedder = Embedder(
-                    model_name=model_name,
-                    model_wts_path=embedder_wts,
-                    max_batch_size=16,
-                    bgr=bgr,
-                    gpu=embedder_gpu,
-                )
-
-        else:
-            self.embedder = None
+            load = functools.partial(
+                self.create_embedder,
+                embedder,
+                half=half,
+                bgr=bgr,
+                embedder_gpu=embedder_gpu,
+                embedder_model_name=embedder_model_name,
+                embedder_wts=embedder_wts,
+                embedder_quantize=embedder_quantize,
+                embedder_calibration=embedder_calibration,
+                embedder_cache=embedder_cache,
+            )
+            if lazy_embedder == "background":
+                loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deepsort-embedder")
+                self._embedder_loader = loader.submit(load).result
+                loader.shutdown(wait=False)
+            elif lazy_embedder:
+                self._embedder_loader = load
+            else:
+                self._embedder = load()
         self.polygon = polygon
+        self.lazy_embedding = lazy_embedding
+        self.refresh_interval = refresh_interval
+        self.refresh_max_speed = refresh_max_speed
+        self.refresh_max_iou_distance = refresh_max_iou_distance
+        if embedder_projection is not None:
+            from deep_sort_realtime.embedder.projection import FeatureProjection
+
+            self.projection = FeatureProjection(embedder_projection)
+        else:
+            self.projection = None
+        self._executor = None
         logger.info("DeepSort Tracker initialised")
         logger.info(f"- max age: {max_age}")
         logger.info(f"- appearance threshold: {max_cosine_distance}")
         logger.info(
             f'- nms threshold: {"OFF" if self.nms_max_overlap==1.0 else self.nms_max_overlap }'
         )
+        logger.info(f'- nms per class : {"Yes" if nms_per_class else "No"}')
         logger.info(f"- max num of appearance features: {nn_budget}")
         logger.info(
             f'- overriding track class : {"No" if override_track_class is None else "Yes"}'
         )
         logger.info(f'- today given : {"No" if today is None else "Yes"}')
-        logger.info(f'- in-build embedder : {"No" if self.embedder is None else "Yes"}')
+        logger.info(f'- in-build embedder : {"No" if embedder is None else "Yes"}')
+        logger.info(f'- lazy embedder loading : {"No" if not lazy_embedder else lazy_embedder}')
         logger.info(f'- polygon detections : {"No" if polygon is False else "Yes"}')
+        logger.info(f'- lazy embedding : {"Yes" if lazy_embedding else "No"}')
+        logger.info(f'- feature refresh interval : {"OFF" if refresh_interval is None else refresh_interval}')
+        logger.info(
+            f'- feature projection : {"OFF" if self.projection is None else f"{self.projection.in_dim} -> {self.projection.out_dim}"}'
+        )
+
+    @property
+    def embedder(self):
+        """The in-built embedder, None if embeddings are given to `update_tracks`.
+        With `lazy_embedder`, the first access loads it, or waits for the
+        background load to finish."""
+        if self._embedder_loader is not None:
+            with self._embedder_lock:
+                if self._embedder_loader is not None:
+                    self._embedder = self._embedder_loader()
+                    self._embedder_loader = None
+        return self._embedder
+
+    @embedder.setter
+    def embedder(self, embedder):
+        with self._embedder_lock:
+            self._embedder = embedder
+            self._embedder_loader = None
+
+    @staticmethod
+    def create_embedder(
+        embedder,
+        half=True,
+        bgr=True,
+        embedder_gpu=True,
+        embedder_model_name=None,
+        embedder_wts=None,
+        embedder_quantize=None,
+        embedder_calibration=None,
+        embedder_cache=False,
+    ):
+        """Load and warm up one of the in-built embedders. Arguments are those
+        of the same name of `DeepSort`."""
+        if embedder == "mobilenet":
+            from deep_sort_realtime.embedder.embedder_pytorch import (
+                MobileNetv2_Embedder as Embedder,
+            )
+
+            return Embedder(
+                half=half,
+                max_batch_size=16,
+                bgr=bgr,
+                gpu=embedder_gpu,
+                model_wts_path=embedder_wts,
+                quantize=embedder_quantize,
+                calibration_crops=embedder_calibration,
+                torchscript_cache=embedder_cache,
+            )
+        elif embedder == "mobilenet_roi":
+            from deep_sort_realtime.embedder.embedder_pytorch import (
+                MobileNetv2_RoIAlign_Embedder as Embedder,
+            )
+
+            return Embedder(
+                half=half,
+                bgr=bgr,
+                gpu=embedder_gpu,
+                model_wts_path=embedder_wts,
+            )
+        elif embedder == "mobilenet_onnx":
+            from deep_sort_realtime.embedder.embedder_onnx import (
+                MobileNetv2_ONNX_Embedder as Embedder,
+            )
+
+            return Embedder(
+                max_batch_size=16,
+                bgr=bgr,
+                model_wts_path=embedder_wts,
+            )
+        elif embedder == 'torchreid':
+            from deep_sort_realtime.embedder.embedder_pytorch import TorchReID_Embedder as Embedder
+
+            return Embedder(
+                bgr=bgr, 
+                gpu=embedder_gpu,
+                model_name=embedder_model_name,
+                model_wts_path=embedder_wts,
+            )
+
+        elif embedder.startswith('clip_'):
+            from deep_sort_realtime.embedder.embedder_clip import (
+                Clip_Embedder as Embedder,
+            )
+
+            model_name = "_".join(embedder.split("_")[1:])
+            return Embedder(
+                model_name=model_name,
+                model_wts_path=embedder_wts,
+                max_batch_size=16,
+                bgr=bgr,
+                gpu=embedder_gpu,
+            )
+        raise Exception(f"Embedder {embedder} is not a valid choice.")
 
     def update_tracks(self, raw_detections, embeds=None, frame=None, today=None, others=None, instance_masks=None):
 
@@ -172,7 +306,7 @@ class DeepSort(object):
         others: Optional[ List ] = None
             Other things associated to detections to be stored in tracks, usually, could be corresponding segmentation mask, other associated values, etc. Currently others is ignored with polygon is True.
         instance_masks: Optional [ List ] = None
-            Instance masks corresponding to detections. If given, they are used to filter out background and only use foreground for apperance embedding. Expects numpy boolean mask matrix.
+            Instance masks corresponding to detections. If given, they are used to filter out background and only use foreground for apperance embedding. Expects numpy boolean mask matrix, either of the full frame or of the detection box only (as per-box segmentation heads output them), or a COCO uncompressed RLE dict of either. Box masks save keeping a frame sized mask per detection.
 
         Returns
         -------
@@ -190,21 +324,37 @@ class DeepSort(object):
 
         assert isinstance(raw_detections,Iterable)
 
+        predicted = False
         if len(raw_detections) > 0: 
             if not self.polygon:
                 assert len(raw_detections[0][0])==4
                 raw_detections = [d for d in raw_detections if d[0][2] > 0 and d[0][3] > 0]
 
+                reused = None
                 if embeds is None:
-                    embeds = self.generate_embeds(frame, raw_detections, instance_masks=instance_masks)
+                    if self.lazy_embedding or self.refresh_interval is not None:
+                        # Lazy embedding gates detections against the predicted
+                        # track states, so propagate tracks before embedding.
+                        self.tracker.predict()
+                        predicted = True
+                        embeds, reused = self.generate_embeds_lazy(frame, raw_detections, instance_masks=instance_masks)
+                    else:
+                        embeds = self.generate_embeds(frame, raw_detections, instance_masks=instance_masks)
+                # Every feature reaching detections and the gallery is projected
+                # here, except reused ones which tracks hold projected already.
+                embeds = self.project_embeds(embeds, reused=reused)
+                if self.refresh_interval is None:
+                    # only the refresh policy keeps reused features out of the gallery
+                    reused = None
 
                 # Proper deep sort detection objects that consist of bbox, confidence and embedding.
-                detections = self.create_detections(raw_detections, embeds, instance_masks=instance_masks, others=others)
+                detections = self.create_detections(raw_detections, embeds, instance_masks=instance_masks, others=others, reused=reused)
             else:
                 polygons, bounding_rects = self.process_polygons(raw_detections[0])
 
                 if embeds is None:
                     embeds = self.generate_embeds_poly(frame, polygons, bounding_rects)
+                embeds = self.project_embeds(embeds)
 
                 # Proper deep sort detection objects that consist of bbox, confidence and embedding.
                 detections = self.create_detections_poly(
@@ -218,22 +368,72 @@ class DeepSort(object):
         scores = np.array([d.confidence for d in detections])
         if self.nms_max_overlap < 1.0:
             # nms_tic = time.perf_counter()
-            indices = non_max_suppression(boxes, self.nms_max_overlap, scores)
+            classes = [d.class_name for d in detections] if self.nms_per_class else None
+            indices = non_max_suppression(boxes, self.nms_max_overlap, scores, classes)
             # nms_toc = time.perf_counter()
             # logger.debug(f'nms time: {nms_toc-nms_tic}s')
             detections = [detections[i] for i in indices]
 
         # Update tracker.
-        self.tracker.predict()
+        if not predicted:
+            self.tracker.predict()
         self.tracker.update(detections, today=today)
 
         return self.tracker.tracks
 
+    def update_tracks_async(self, raw_detections, embeds=None, frame=None, today=None, others=None, instance_masks=None):
+        """Submit `update_tracks` to a background worker and return at once.
+
+        Updates run on a single worker thread, one at a time and in the order
+        they are submitted, so the results are the same as calling
+        `update_tracks` in that order. Embedding and tracking of a frame can
+        then overlap with work on the calling thread, e.g. running the
+        detector on the next frame (torch and onnxruntime release the GIL
+        during inference).
+
+        The tracks in the result are the tracker's live objects. Read them
+        before submitting the next update, and do not call `update_tracks`
+        or `delete_all_tracks` while an update is pending.
+
+        Parameters are the same as for `update_tracks`. `frame` must not be
+        modified until the update is done.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the return value of `update_tracks`, or raises its
+            exception.
+
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deepsort")
+        return self._executor.submit(
+            self.update_tracks,
+            raw_detections,
+            embeds=embeds,
+            frame=frame,
+            today=today,
+            others=others,
+            instance_masks=instance_masks,
+        )
+
+    def shutdown(self, wait=True):
+        """Stop the background worker of `update_tracks_async`, if any. With
+        `wait`, pending updates are finished first."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
     def refresh_track_ids(self):
         self.tracker._next_id
 
     def generate_embeds(self, frame, raw_dets, instance_masks=None):
+        if getattr(self.embedder, "takes_boxes", False):
+            return self.embedder.predict(frame, [d[0] for d in raw_dets])
         crops, cropped_inst_masks = self.crop_bb(frame, raw_dets, instance_masks=instance_masks)
+        if cropped_inst_masks is not None and getattr(self.embedder, "supports_masks", False):
+            # composited into the embedder's resized crops, without copying them
+            return self.embedder.predict(crops, masks=cropped_inst_masks)
         if cropped_inst_masks is not None:
             masked_crops = []
             for crop, mask in zip(crops, cropped_inst_masks):
@@ -245,11 +445,87 @@ class DeepSort(object):
         else:
             return self.embedder.predict(crops)
 
-    def generate_embeds_poly(self, frame, polygons, bounding_rects):
-        crops = self.crop_poly_pad_black(frame, polygons, bounding_rects)
-        return self.embedder.predict(crops)
+    def project_embeds(self, embeds, reused=None):
+        """Features projected with embedder_projection, if one was given.
+        Features flagged in `reused` were taken from tracks, which hold them
+        projected already, and are passed through."""
+        if self.projection is None or len(embeds) == 0:
+            return embeds
+        fresh = [i for i in range(len(embeds)) if reused is None or not reused[i]]
+        if not fresh:
+            return list(embeds)
+        features = [np.asarray(embeds[i]) for i in fresh]
+        dims = sorted({feature.size for feature in features})
+        if dims != [self.projection.in_dim]:
+            raise ValueError(
+                f"embedder_projection expects {self.projection.in_dim}-d features, got {dims}-d"
+            )
+        embeds = list(embeds)
+        for i, feature in zip(fresh, self.projection(np.stack(features))):
+            embeds[i] = feature
+        return embeds
+
+    def generate_embeds_lazy(self, frame, raw_dets, instance_masks=None):
+        """Like `generate_embeds`, but detections with an unambiguous track
+        reuse that track's latest feature instead of being embedded, if
+        `can_reuse_feature` allows it. Expects the tracker to have been
+        propagated to the current frame already.
+
+        Returns the embeddings and, per detection, whether it was reused.
+        Reused features are as tracks hold them, i.e. projected if
+        embedder_projection is given, computed ones are not projected yet
+        (see `project_embeds`).
+        """
+        candidates = self.tracker.unambiguous_candidates([d[0] for d in raw_dets])
+        embeds = [None] * len(raw_dets)
+        reused = [False] * len(raw_dets)
+        to_embed = []
+        for i, track_idx in enumerate(candidates):
+            if track_idx >= 0 and self.can_reuse_feature(self.tracker.tracks[track_idx], raw_dets[i][0]):
+                embeds[i] = self.tracker.tracks[track_idx].get_feature()
+                reused[i] = True
+            else:
+                to_embed.append(i)
+        if to_embed:
+            new_embeds = self.generate_embeds(
+                frame,
+                [raw_dets[i] for i in to_embed],
+                instance_masks=None if instance_masks is None else [instance_masks[i] for i in to_embed],
+            )
+            for i, embed in zip(to_embed, new_embeds):
+                embeds[i] = embed
+        logger.debug(f"lazy embedding: embedded {len(to_embed)} of {len(raw_dets)} detections")
+        return embeds, reused
+
+    def can_reuse_feature(self, track, ltwh):
+        """Whether a detection at `ltwh`, unambiguously associated with
+        `track`, may reuse the track's latest feature: always with lazy
+        embedding, otherwise only if the track is stationary. With a refresh
+        interval, features older than it are never reused.
+        """
+        if track.latest_feature is None:
+            return False
+        if self.refresh_interval is not None and track.frames_since_feature >= self.refresh_interval:
+            return False
+        if self.lazy_embedding:
+            return True
+        if track.feature_ltwh is None or np.hypot(*track.mean[4:6]) > self.refresh_max_speed:
+            return False
+        overlap = iou_matching.iou(
+            np.asarray(ltwh, dtype=float), np.asarray(track.feature_ltwh, dtype=float)[np.newaxis]
+        )[0]
+        return 1.0 - overlap <= self.refresh_max_iou_distance
 
-    def create_detections(self, raw_dets, embeds, instance_masks=None, others=None):
+    def generate_embeds_poly(self, frame, polygons, bounding_rects):
+        if getattr(self.embedder, "takes_boxes", False):
+            return self.embedder.predict(frame, bounding_rects)
+        crops, masks = self.crop_poly(frame, polygons, bounding_rects)
+        if getattr(self.embedder, "supports_masks", False):
+            # padded black while resizing into the embedder's batch
+            return self.embedder.predict(crops, masks=masks, fill=0)
+        return self.embedder.predict(self.pad_black(crops, masks))
+
+    def create_detections(self, raw_dets, embeds, instance_masks=None, others=None, reused=None):
         detection_list = []
         for i, (raw_det, embed) in enumerate(zip(raw_dets, embeds)):
             detection_list.append(
@@ -260,32 +536,56 @@ class DeepSort(object):
                     class_name=raw_det[2] if len(raw_det)==3 else None,
                     instance_mask = instance_masks[i] if isinstance(instance_masks, Iterable) else instance_masks,
                     others = others[i] if isinstance(others, Iterable) else others,
+                    feature_reused = reused[i] if reused is not None else False,
                 )
             )  # raw_det = [bbox, conf_score, class]
         return detection_list
 
     def create_detections_poly(self, dets, embeds, bounding_rects):
-        detection_list = []
-        dets.extend([embeds, bounding_rects])
-        for raw_polygon, cl, score, embed, bounding_rect in zip(*dets):
-            x, y, w, h = bounding_rect
-            x = max(0, x)
-            y = max(0, y)
-            bbox = [x, y, w, h]
-            detection_list.append(
-                Detection(bbox, score, embed, class_name=cl, others=raw_polygon)
-            )
-        return detection_list
+        raw_polygons, classes, scores = dets
+        # boxes are clipped to the frame at the top left only
+        bboxes = np.array(bounding_rects, copy=True).reshape(-1, 4)
+        np.maximum(bboxes[:, :2], 0, out=bboxes[:, :2])
+        return [
+            Detection(bbox, score, embed, class_name=cl, others=raw_polygon)
+            for raw_polygon, cl, score, embed, bbox in zip(raw_polygons, classes, scores, embeds, bboxes)
+        ]
 
     @staticmethod
     def process_polygons(raw_polygons):
-        polygons = [
-            [polygon[x : x + 2] for x in range(0, len(polygon), 2)]
-            for polygon in raw_polygons
-        ]
-        bounding_rects = [
-            cv2.boundingRect(np.array([polygon]).astype(int)) for polygon in polygons
-        ]
+        """Polygons as integer (K x 2) vertex arrays, and their bounding rects.
+
+        Parameters
+        ----------
+        raw_polygons : List[ ndarray-like ]
+            Polygons as [x1,y1,x2,y2,...].
+
+        Returns
+        -------
+        (ndarray | List[ndarray], ndarray)
+            The polygons, as one (N x K x 2) int32 array if they all have K
+            vertices (e.g. oriented boxes), else as a list of (K_i x 2)
+            arrays; and the (N x 4) bounding rects (x, y, w, h) of their
+            vertices, as cv2.boundingRect computes them.
+
+        """
+        try:
+            polygons = np.asarray(raw_polygons, dtype=np.float64)
+        except ValueError:
+            polygons = None
+        if polygons is not None and polygons.ndim == 2:
+            polygons = polygons.reshape(len(polygons), -1, 2).astype(np.int32)
+            top_left = polygons.min(axis=1)
+            bottom_right = polygons.max(axis=1)
+        else:
+            # different numbers of vertices
+            polygons = [
+                np.asarray(polygon, dtype=np.float64).reshape(-1, 2).astype(np.int32)
+                for polygon in raw_polygons
+            ]
+            top_left = np.array([polygon.min(axis=0) for polygon in polygons]).reshape(-1, 2)
+            bottom_right = np.array([polygon.max(axis=0) for polygon in polygons]).reshape(-1, 2)
+        bounding_rects = np.concatenate([top_left, bottom_right - top_left + 1], axis=1)
         return polygons, bounding_rects
 
     @staticmethod
@@ -306,31 +606,47 @@ class DeepSort(object):
             crop_b = min(im_height, b)
             crops.append(frame[crop_t:crop_b, crop_l:crop_r])
             if instance_masks is not None: 
-                masks.append( instance_masks[i][crop_t:crop_b, crop_l:crop_r] )
+                masks.append(
+                    crop_mask(instance_masks[i], (l, t, r, b), (crop_l, crop_t, crop_r, crop_b), frame.shape)
+                )
         
         return crops, masks
 
     @staticmethod
-    def crop_poly_pad_black(frame, polygons, bounding_rects):
-        masked_polys = []
+    def crop_poly(frame, polygons, bounding_rects):
+        """Crops of the polygons' bounding rects (clipped to the frame), as
+        views of the frame, and uint8 masks of the polygons within them. Each
+        polygon is rasterized in its own rect only, in rect coordinates.
+        """
+        import cv2
+
+        crops = []
+        masks = []
         im_height, im_width = frame.shape[:2]
         for polygon, bounding_rect in zip(polygons, bounding_rects):
-            mask = np.zeros(frame.shape, dtype=np.uint8)
-            polygon_mask = np.array([polygon]).astype(int)
-            cv2.fillPoly(mask, polygon_mask, color=(255, 255, 255))
-
-            # apply the mask
-            masked_image = cv2.bitwise_and(frame, mask)
-
-            # crop masked image
             x, y, w, h = bounding_rect
             crop_l = max(0, x)
             crop_r = min(im_width, x + w)
             crop_t = max(0, y)
             crop_b = min(im_height, y + h)
-            cropped = masked_image[crop_t:crop_b, crop_l:crop_r].copy()
-            masked_polys.append(np.array(cropped))
-        return masked_polys
+            crops.append(frame[crop_t:crop_b, crop_l:crop_r])
+            mask = np.zeros((crop_b - crop_t, crop_r - crop_l), dtype=np.uint8)
+            shifted = np.asarray(polygon, dtype=np.int32) - np.array([crop_l, crop_t], dtype=np.int32)
+            cv2.fillPoly(mask, shifted[np.newaxis], color=255)
+            masks.append(mask)
+        return crops, masks
+
+    @staticmethod
+    def pad_black(crops, masks):
+        """Copies of the crops, black outside their masks."""
+        import cv2
+
+        return [cv2.bitwise_and(crop, crop, mask=mask) for crop, mask in zip(crops, masks)]
+
+    @staticmethod
+    def crop_poly_pad_black(frame, polygons, bounding_rects):
+        crops, masks = DeepSort.crop_poly(frame, polygons, bounding_rects)
+        return DeepSort.pad_black(crops, masks)
 
     def delete_all_tracks(self):
         self.tracker.delete_all_tracks()
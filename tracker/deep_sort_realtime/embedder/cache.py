@@ -0,0 +1,86 @@
+"""On-disk caches of prepared embedder models (TorchScript, ONNX).
+
+A cache file is named `<weights stem>.<variant>.<key>.<extension>`, where the
+key is a digest of everything the prepared model is built from, so replacing
+the weights (or changing anything else in the key) makes a new file rather
+than silently loading the old one. It is written next to the weights, or to
+USER_CACHE_DIR if that directory is not writable (e.g. an installed package).
+"""
+import glob
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "deep_sort_realtime",
+)
+
+
+def file_signature(path):
+    """(absolute path, size, modification time) of a file, which changes when
+    the file is replaced."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def cache_key(*items):
+    """Short hex digest of the repr of `items`."""
+    return hashlib.sha1(repr(items).encode()).hexdigest()[:16]
+
+
+def candidate_paths(model_wts_path, variant, key, extension):
+    """Candidate paths of a cache, in order of preference: next to the
+    weights, then in USER_CACHE_DIR."""
+    stem = os.path.splitext(os.path.basename(model_wts_path))[0]
+    name = f"{stem}.{variant}.{key}.{extension}"
+    weights_dir = os.path.dirname(os.path.abspath(model_wts_path))
+    return [os.path.join(weights_dir, name), os.path.join(USER_CACHE_DIR, name)]
+
+
+def find_cache(paths):
+    """The first of `paths` that exists, or None."""
+    return next((path for path in paths if os.path.exists(path)), None)
+
+
+def save_cache(paths, save, description):
+    """
+    Write a cache to the first writable of `paths`, and remove stale caches
+    of the same weights and variant (other keys) from that directory.
+
+    Params
+    ------
+    - paths (list of str) : candidate paths, from `candidate_paths`
+    - save (callable) : writes the cache to the path it is given
+    - description (str) : what is cached, for the log
+
+    Returns
+    ------
+    The path written, or None if no path was writable (a warning is logged).
+    """
+    for path in paths:
+        # Write to a temporary file first so an interrupted save never leaves
+        # a truncated model in the cache.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save(tmp_path)
+            os.replace(tmp_path, path)
+        except (OSError, RuntimeError) as e:
+            logger.info(f"Could not save {description} to {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        logger.info(f"Saved {description} to {path}")
+        stem_variant, _, extension = path.rsplit(".", 2)
+        for stale in glob.glob(f"{glob.escape(stem_variant)}.*.{extension}"):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return path
+    logger.warning(f"No writable location for the {description}, it will be prepared again on the next start")
+    return None
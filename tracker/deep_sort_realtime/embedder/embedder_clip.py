@@ -3,11 +3,11 @@ import logging
 from pathlib import Path
 
 import clip
-import cv2
 import numpy as np
-import pkg_resources
 import torch
-from PIL import Image
+import torch.nn.functional as F
+
+from deep_sort_realtime.embedder.preprocess import CLIP_MEAN, CLIP_STD
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +54,9 @@ class Clip_Embedder(object):
         self.device = "cuda" if gpu else "cpu"
         self.model, self.img_preprocess = clip.load(model_wts_path, device=self.device)
         self.model.eval()
+        self.input_resolution = self.model.visual.input_resolution
+        self._scale = torch.from_numpy(1.0 / (255.0 * CLIP_STD))[:, None, None]
+        self._shift = torch.from_numpy(-CLIP_MEAN / CLIP_STD)[:, None, None]
 
         self.max_batch_size = max_batch_size
         self.bgr = bgr
@@ -67,6 +70,43 @@ class Clip_Embedder(object):
         zeros = np.zeros((100, 100, 3), dtype=np.uint8)
         self.predict([zeros])  # warmup
 
+    def preprocess_batch(self, np_images):
+        """
+        Batched tensor version of CLIP's PIL image transform (`self.img_preprocess`): bicubic, antialiased resize of the shorter side to the input resolution, center crop, scaling to [0, 1] and normalisation with CLIP's mean and std. Resized crops are rounded to uint8 values like the PIL images are, so the results match up to interpolation rounding.
+
+        Parameters
+        ----------
+        np_images : list of ndarray
+            list of (H x W x C), bgr or rgb according to self.bgr
+
+        Returns
+        -------
+        Torch Tensor
+            (B x C x H x W) on self.device
+
+        """
+        n_px = self.input_resolution
+        batch = torch.empty((len(np_images), 3, n_px, n_px), dtype=torch.float32)
+        for np_image, dst in zip(np_images, batch):
+            height, width = np_image.shape[:2]
+            # Same output size as torchvision's Resize(n_px).
+            if width <= height:
+                size = (int(n_px * height / width), n_px)
+            else:
+                size = (n_px, int(n_px * width / height))
+            image = torch.from_numpy(np.ascontiguousarray(np_image)).permute(2, 0, 1)
+            if self.bgr:
+                image = image.flip(0)
+            image = F.interpolate(
+                image[None].float(), size=size, mode="bicubic", align_corners=False, antialias=True
+            )[0]
+            top = int(round((size[0] - n_px) / 2.0))
+            left = int(round((size[1] - n_px) / 2.0))
+            dst.copy_(image[:, top : top + n_px, left : left + n_px])
+        batch.clamp_(0, 255).round_()
+        batch.mul_(self._scale).add_(self._shift)
+        return batch.to(self.device)
+
     def predict(self, np_images):
         """
         batch inference
@@ -84,18 +124,10 @@ class Clip_Embedder(object):
         if not np_images:
             return []
 
-        if self.bgr:
-            np_images = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in np_images]
-
-        pil_images = [
-            self.img_preprocess(Image.fromarray(rgb)).to(self.device)
-            for rgb in np_images
-        ]
-
         all_feats = []
-        for this_batch in _batch(pil_images, bs=self.max_batch_size):
-            batch = torch.stack(this_batch, 0)
-            with torch.no_grad():
+        with torch.no_grad():
+            for this_batch in _batch(np_images, bs=self.max_batch_size):
+                batch = self.preprocess_batch(this_batch)
                 feats = self.model.encode_image(batch)
-            all_feats.extend(feats.cpu().data.numpy())
+                all_feats.extend(feats.cpu().data.numpy())
         return all_feats
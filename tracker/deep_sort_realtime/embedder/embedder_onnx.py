@@ -0,0 +1,152 @@
+import os
+import inspect
+import logging
+from importlib import metadata, resources
+
+import numpy as np
+
+from deep_sort_realtime.embedder.cache import cache_key, candidate_paths, file_signature, find_cache, save_cache
+from deep_sort_realtime.embedder.preprocess import MASK_FILL, BatchPreprocessor
+
+logger = logging.getLogger(__name__)
+
+MOBILENETV2_BOTTLENECK_WTS = str(
+    resources.files("deep_sort_realtime") / "embedder" / "weights" / "mobilenetv2_bottleneck_wts.pt"
+)
+
+INPUT_WIDTH = 224
+
+OPSET_VERSION = 17
+
+
+def export_mobilenetv2_onnx(model_wts_path, onnx_path):
+    """
+    Export MobileNetV2_bottle with the given torch weights to an ONNX model with a dynamic batch dimension. Needs torch, which is imported here so that running an already exported model does not.
+
+    Parameters
+    ----------
+    model_wts_path : str
+        path to mobilenetv2 torch weights
+    onnx_path : str
+        path the ONNX model is written to
+    """
+    import torch
+    from deep_sort_realtime.embedder.mobilenetv2_bottle import MobileNetV2_bottle
+
+    model = MobileNetV2_bottle(input_size=INPUT_WIDTH, width_mult=1.0)
+    model.load_state_dict(torch.load(model_wts_path, map_location="cpu"))
+    model.eval()
+
+    dummy = torch.zeros((1, 3, INPUT_WIDTH, INPUT_WIDTH))
+    # Newer torch defaults to the torch.export based exporter, which stores
+    # weights in a separate file; the TorchScript one writes a single file.
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+    torch.onnx.export(
+        model,
+        dummy,
+        onnx_path,
+        input_names=["input"],
+        output_names=["features"],
+        dynamic_axes={"input": {0: "batch"}, "features": {0: "batch"}},
+        opset_version=OPSET_VERSION,
+        **export_kwargs,
+    )
+
+
+def onnx_cache_paths(model_wts_path):
+    """Candidate paths of the exported model of `model_wts_path`, in order of preference: next to the weights, then in USER_CACHE_DIR (see `deep_sort_realtime.embedder.cache`). The name carries a digest of the weights file (path, size and modification time), the torch version and the export settings."""
+    try:
+        torch_version = metadata.version("torch")
+    except metadata.PackageNotFoundError:
+        torch_version = None
+    key = cache_key(file_signature(model_wts_path), torch_version, INPUT_WIDTH, OPSET_VERSION)
+    return candidate_paths(model_wts_path, "onnx", key, "onnx")
+
+
+class MobileNetv2_ONNX_Embedder(object):
+    """
+    MobileNetv2_ONNX_Embedder runs the same Mobilenetv2 bottleneck network as MobileNetv2_Embedder with onnxruntime on CPU, outputing a feature of size 1280. The network is exported to ONNX once and cached next to the torch weights, or in ~/.cache/deep_sort_realtime if that directory is not writable; replacing the weights file exports it again.
+
+    Params
+    ------
+    - model_wts_path (optional, str) : path to mobilenetv2 torch weights, defaults to the model file in ./mobilenetv2
+    - max_batch_size (optional, int) : max batch size for embedder, defaults to 16
+    - bgr (optional, Bool) : boolean flag indicating if input frames are bgr or not, defaults to True
+    - num_threads (optional, int) : number of intra-op threads for onnxruntime, defaults to onnxruntime's choice
+    """
+
+    supports_masks = True
+
+    def __init__(self, model_wts_path=None, max_batch_size=16, bgr=True, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise Exception('ImportError: onnxruntime is not installed, please install and try again or choose another embedder')
+
+        if model_wts_path is None:
+            model_wts_path = MOBILENETV2_BOTTLENECK_WTS
+        assert os.path.exists(
+            model_wts_path
+        ), f"Mobilenetv2 model path {model_wts_path} does not exists!"
+        cache_paths = onnx_cache_paths(model_wts_path)
+        onnx_path = find_cache(cache_paths)
+        if onnx_path is None:
+            onnx_path = save_cache(
+                cache_paths,
+                lambda path: export_mobilenetv2_onnx(model_wts_path, path),
+                "ONNX Mobilenetv2",
+            )
+            if onnx_path is None:
+                raise Exception(f"Could not export Mobilenetv2 to ONNX, none of {cache_paths} is writable")
+
+        sess_options = ort.SessionOptions()
+        if num_threads is not None:
+            sess_options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        self.max_batch_size = max_batch_size
+        self.bgr = bgr
+        self._preprocessor = BatchPreprocessor(max_batch_size, INPUT_WIDTH, bgr=bgr)
+
+        logger.info("MobileNetV2 Embedder (onnxruntime) for Deep Sort initialised")
+        logger.info(f"- model: {onnx_path}")
+        logger.info(f"- max batch size: {self.max_batch_size}")
+        logger.info(f"- expects BGR: {self.bgr}")
+
+        zeros = np.zeros((100, 100, 3), dtype=np.uint8)
+        self.predict([zeros])  # warmup
+
+    def predict(self, np_images, masks=None, fill=MASK_FILL):
+        """
+        batch inference
+
+        Params
+        ------
+        np_images : list of ndarray
+            list of (H x W x C), bgr or rgb according to self.bgr
+        masks (optional, list) : per image, None or a (H x W) foreground mask; the background is replaced by `fill` while resizing
+        fill (optional, array) : background colour, in the images' channel order, defaults to the imagenet mean
+
+        Returns
+        ------
+        list of features (np.array with dim = 1280)
+
+        """
+        all_feats = []
+
+        for start in range(0, len(np_images), self.max_batch_size):
+            stop = start + self.max_batch_size
+            this_batch = self._preprocessor(
+                np_images[start:stop],
+                masks=None if masks is None else masks[start:stop],
+                fill=fill,
+            )
+            output = self.session.run(None, {self.input_name: this_batch})[0]
+            all_feats.extend(output)
+
+        return all_feats
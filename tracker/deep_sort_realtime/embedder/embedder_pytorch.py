@@ -1,26 +1,27 @@
 import os
+import hashlib
 import logging
+from importlib import resources
 
-import cv2
 import numpy as np
-import pkg_resources
 import torch
-from torchvision.transforms import transforms
 
+from deep_sort_realtime.embedder.cache import cache_key, candidate_paths, file_signature, find_cache, save_cache
 from deep_sort_realtime.embedder.mobilenetv2_bottle import MobileNetV2_bottle
+from deep_sort_realtime.embedder.preprocess import MASK_FILL, BatchPreprocessor, load_crops
 
 logger = logging.getLogger(__name__)
 
-MOBILENETV2_BOTTLENECK_WTS = pkg_resources.resource_filename(
-    "deep_sort_realtime", "embedder/weights/mobilenetv2_bottleneck_wts.pt"
-)
+WEIGHTS_DIR = resources.files("deep_sort_realtime") / "embedder" / "weights"
 
-TORCHREID_OSNET_AIN_X1_0_MS_D_C_WTS = pkg_resources.resource_filename(
-    "deep_sort_realtime", "embedder/weights/osnet_ain_ms_d_c_wtsonly.pth"
-)
+MOBILENETV2_BOTTLENECK_WTS = str(WEIGHTS_DIR / "mobilenetv2_bottleneck_wts.pt")
+
+TORCHREID_OSNET_AIN_X1_0_MS_D_C_WTS = str(WEIGHTS_DIR / "osnet_ain_ms_d_c_wtsonly.pth")
 
 INPUT_WIDTH = 224
 
+QUANTIZE_CHOICES = [None, "int8"]
+
 
 def batch(iterable, bs=1):
     l = len(iterable)
@@ -39,41 +40,150 @@ class MobileNetv2_Embedder(object):
     - max_batch_size (optional, int) : max batch size for embedder, defaults to 16
     - bgr (optional, Bool) : boolean flag indicating if input frames are bgr or not, defaults to True
     - gpu (optional, Bool) : boolean flag indicating if gpu is enabled or not
+    - quantize (optional, str) : None (default) or "int8" for post-training static int8 quantization, which runs on cpu only (gpu and half are ignored)
+    - calibration_crops (optional, str or list) : crops to calibrate the int8 activation ranges on, a directory of images or a list of image paths / ndarrays (see `preprocess.load_crops`). Required if quantize is "int8", ideally a few hundred crops recorded from the target cameras
+    - torchscript_cache (optional, Bool) : boolean flag to save the prepared (optimized or quantized) model as TorchScript next to the weights (or in ~/.cache/deep_sort_realtime if that directory is not writable), and load it from there on later starts instead of preparing it again, defaults to False. The cache is keyed on the weights file, the model variant, the torch version and, for a quantized model, the calibration crops, so changing any of them rebuilds it
     """
 
+    supports_masks = True
+
     def __init__(
-        self, model_wts_path=None, half=True, max_batch_size=16, bgr=True, gpu=True
+        self,
+        model_wts_path=None,
+        half=True,
+        max_batch_size=16,
+        bgr=True,
+        gpu=True,
+        quantize=None,
+        calibration_crops=None,
+        torchscript_cache=False,
     ):
         if model_wts_path is None:
             model_wts_path = MOBILENETV2_BOTTLENECK_WTS
         assert os.path.exists(
             model_wts_path
         ), f"Mobilenetv2 model path {model_wts_path} does not exists!"
-        self.model = MobileNetV2_bottle(input_size=INPUT_WIDTH, width_mult=1.0)
-        self.model.load_state_dict(torch.load(model_wts_path))
-
-        self.gpu = gpu and torch.cuda.is_available()
-        if self.gpu:
-            self.model.cuda()  # loads model to gpu
-            self.half = half
-            if self.half:
-                self.model.half()
+        if quantize not in QUANTIZE_CHOICES:
+            raise Exception(f"Quantization {quantize} is not a valid choice.")
+        if quantize is not None and calibration_crops is None:
+            raise Exception(f"Quantization {quantize} needs calibration crops.")
+        self.quantize = quantize
+        self.max_batch_size = max_batch_size
+        self.bgr = bgr
+        self._preprocessor = BatchPreprocessor(max_batch_size, INPUT_WIDTH, bgr=bgr)
+
+        # int8 kernels only run on cpu
+        self.gpu = gpu and torch.cuda.is_available() and self.quantize is None
+        self.half = half and self.gpu
+
+        cache_paths = []
+        if torchscript_cache:
+            cache_paths = self.torchscript_cache_paths(model_wts_path, calibration_crops)
+        cache_path = find_cache(cache_paths)
+        if cache_path is not None:
+            self.model = torch.jit.load(cache_path, map_location="cuda" if self.gpu else "cpu")
+            logger.info(f"Loaded TorchScript Mobilenetv2 from {cache_path}")
         else:
-            self.half = False
+            self.model = MobileNetV2_bottle(input_size=INPUT_WIDTH, width_mult=1.0)
+            self.model.load_state_dict(torch.load(model_wts_path, map_location="cpu"))
+            if self.quantize == "int8":
+                self.model = self._quantize_int8(load_crops(calibration_crops, bgr=bgr))
+            else:
+                self.model.optimize_for_inference()
 
-        self.model.eval()  # inference mode, deactivates dropout layers
+            if self.gpu:
+                self.model.cuda()  # loads model to gpu
+                if self.half:
+                    self.model.half()
+            if cache_paths:
+                self._save_torchscript(cache_paths)
 
-        self.max_batch_size = max_batch_size
-        self.bgr = bgr
+        self.model.eval()  # inference mode, deactivates dropout layers
 
         logger.info("MobileNetV2 Embedder for Deep Sort initialised")
         logger.info(f"- gpu enabled: {self.gpu}")
         logger.info(f"- half precision: {self.half}")
+        logger.info(f"- quantization: {self.quantize}")
         logger.info(f"- max batch size: {self.max_batch_size}")
         logger.info(f"- expects BGR: {self.bgr}")
 
         zeros = np.zeros((100, 100, 3), dtype=np.uint8)
-        self.predict([zeros])  # warmup
+        # TorchScript optimises the graph during its first runs
+        for _ in range(2 if isinstance(self.model, torch.jit.ScriptModule) else 1):
+            self.predict([zeros])  # warmup
+
+    def _variant(self):
+        if self.quantize is not None:
+            return self.quantize
+        if self.gpu:
+            return "cuda_half" if self.half else "cuda"
+        return "cpu"
+
+    def torchscript_cache_key(self, model_wts_path, calibration_crops=None):
+        """Digest of everything the prepared model depends on: the weights file (path, size and modification time), the model variant (cpu / cuda / cuda_half / int8), the torch version and, for a quantized model, the calibration crops (files by path, size and modification time, arrays by content)."""
+        items = [file_signature(model_wts_path), self._variant(), torch.__version__, INPUT_WIDTH]
+        if self.quantize is not None:
+            items += [torch.backends.quantized.engine, self.bgr, self.max_batch_size]
+            if isinstance(calibration_crops, str):
+                calibration_crops = [
+                    os.path.join(calibration_crops, name)
+                    for name in sorted(os.listdir(calibration_crops))
+                ]
+            for crop in calibration_crops:
+                if isinstance(crop, str):
+                    items.append(file_signature(crop))
+                else:
+                    crop = np.ascontiguousarray(crop)
+                    items.append((crop.shape, str(crop.dtype), hashlib.sha1(crop.data).hexdigest()))
+        return cache_key(*items)
+
+    def torchscript_cache_paths(self, model_wts_path, calibration_crops=None):
+        """Candidate paths of the TorchScript cache, in order of preference: next to the weights, then in USER_CACHE_DIR (see `deep_sort_realtime.embedder.cache`)."""
+        key = self.torchscript_cache_key(model_wts_path, calibration_crops)
+        return candidate_paths(model_wts_path, self._variant(), key, "ts")
+
+    def _save_torchscript(self, cache_paths):
+        """Trace and freeze self.model, save it to the first writable path of
+        `cache_paths` and use the traced model from now on. If no path is
+        writable, a warning is logged and nothing is cached."""
+        example = self.preprocess_batch([np.zeros((INPUT_WIDTH, INPUT_WIDTH, 3), dtype=np.uint8)])
+        if self.gpu:
+            example = example.cuda()
+            if self.half:
+                example = example.half()
+        with torch.inference_mode():
+            traced = torch.jit.freeze(torch.jit.trace(self.model.eval(), example))
+        self.model = traced
+        save_cache(cache_paths, lambda path: torch.jit.save(traced, path), "TorchScript Mobilenetv2")
+
+    def _quantize_int8(self, crops):
+        """
+        Post-training static quantization of self.model (fp32, on cpu) with torch FX graph mode: conv/bn/relu are fused, observers record activation ranges over the calibration crops, and the model is converted to int8 kernels of the current quantized engine (fbgemm / x86 on x86, qnnpack on arm).
+
+        Parameters
+        ----------
+        crops : list of ndarray
+            calibration crops, (H x W x C)
+
+        Returns
+        -------
+        torch.fx.GraphModule
+            quantized model
+
+        """
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        assert len(crops) > 0, "No calibration crops given"
+        self.model.eval()
+        qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+        example = self.preprocess_batch(crops[:1])
+        prepared = prepare_fx(self.model, qconfig_mapping, example_inputs=(example,))
+        with torch.inference_mode():
+            for this_batch in batch(crops, bs=self.max_batch_size):
+                prepared(self.preprocess_batch(this_batch))
+        logger.info(f"Mobilenetv2 quantized to int8 with {len(crops)} calibration crops")
+        return convert_fx(prepared)
 
     def preprocess(self, np_image):
         """
@@ -89,26 +199,30 @@ class MobileNetv2_Embedder(object):
         Torch Tensor
 
         """
-        if self.bgr:
-            np_image_rgb = np_image[..., ::-1]
-        else:
-            np_image_rgb = np_image
+        return self.preprocess_batch([np_image]).clone()
 
-        input_image = cv2.resize(np_image_rgb, (INPUT_WIDTH, INPUT_WIDTH))
-        trans = transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
-        )
-        input_image = trans(input_image)
-        input_image = input_image.view(1, 3, INPUT_WIDTH, INPUT_WIDTH)
+    def preprocess_batch(self, np_images, masks=None, fill=MASK_FILL):
+        """
+        Batched preprocessing for embedder network, same result as `preprocess` on each image, done in buffers reused across frames (see `BatchPreprocessor`). Note: the returned tensor shares memory with that buffer, which is overwritten by the next call.
 
-        return input_image
+        Parameters
+        ----------
+        np_images : list of ndarray
+            At most `max_batch_size` images of (H x W x C)
+        masks : list, optional
+            Per image, None or a (H x W) foreground mask, outside of which `fill` is composited
+        fill : array_like
+            Background colour, in the images' channel order
 
-    def predict(self, np_images):
+        Returns
+        -------
+        Torch Tensor
+            (B x C x H x W)
+
+        """
+        return torch.from_numpy(self._preprocessor(np_images, masks=masks, fill=fill))
+
+    def predict(self, np_images, masks=None, fill=MASK_FILL):
         """
         batch inference
 
@@ -116,6 +230,8 @@ class MobileNetv2_Embedder(object):
         ------
         np_images : list of ndarray
             list of (H x W x C), bgr or rgb according to self.bgr
+        masks (optional, list) : per image, None or a (H x W) foreground mask; the background is replaced by `fill` while resizing
+        fill (optional, array) : background colour, in the images' channel order, defaults to the imagenet mean
 
         Returns
         ------
@@ -124,19 +240,153 @@ class MobileNetv2_Embedder(object):
         """
         all_feats = []
 
-        preproc_imgs = [self.preprocess(img) for img in np_images]
+        with torch.inference_mode():
+            for start in range(0, len(np_images), self.max_batch_size):
+                stop = start + self.max_batch_size
+                this_batch = self.preprocess_batch(
+                    np_images[start:stop],
+                    masks=None if masks is None else masks[start:stop],
+                    fill=fill,
+                )
+                if self.gpu:
+                    this_batch = this_batch.cuda()
+                    if self.half:
+                        this_batch = this_batch.half()
+                output = self.model.forward(this_batch)
+
+                all_feats.extend(output.cpu().data.numpy())
+
+        return all_feats
+
+
+class MobileNetv2_RoIAlign_Embedder(object):
+    """
+    MobileNetv2_RoIAlign_Embedder runs the Mobilenetv2 bottleneck network of MobileNetv2_Embedder once per frame, on the downscaled full frame, and pools a feature of size 1280 per detection box from the resulting (stride 32) feature map with RoI Align. The cost per frame is then nearly independent of the number of detections. Unlike the other embedders, `predict` takes the frame and the boxes instead of crops. Features are not interchangeable with those of MobileNetv2_Embedder, since the context around each box leaks into them.
+
+    Params
+    ------
+    - model_wts_path (optional, str) : path to mobilenetv2 model weights, defaults to the model file in ./mobilenetv2
+    - half (optional, Bool) : boolean flag to use half precision or not, defaults to True
+    - max_batch_size: Does nothing, just for compatibility to other embedder classes
+    - bgr (optional, Bool) : boolean flag indicating if input frames are bgr or not, defaults to True
+    - gpu (optional, Bool) : boolean flag indicating if gpu is enabled or not
+    - frame_width (optional, int) : the longer side of the frame is downscaled to this (rounded to a multiple of 32) before the backbone pass, defaults to 960
+    - pooled_size (optional, int) : side of the RoI Align output grid, which is then averaged into one feature, defaults to 4
+    """
+
+    takes_boxes = True
+    stride = 32
 
-        for this_batch in batch(preproc_imgs, bs=self.max_batch_size):
-            this_batch = torch.cat(this_batch, dim=0)
+    def __init__(
+        self,
+        model_wts_path=None,
+        half=True,
+        max_batch_size=None,
+        bgr=True,
+        gpu=True,
+        frame_width=960,
+        pooled_size=4,
+    ):
+        try:
+            from torchvision.ops import roi_align
+        except ImportError:
+            raise Exception('ImportError: torchvision is not installed, please install and try again or choose another embedder')
+        self._roi_align = roi_align
+
+        if model_wts_path is None:
+            model_wts_path = MOBILENETV2_BOTTLENECK_WTS
+        assert os.path.exists(
+            model_wts_path
+        ), f"Mobilenetv2 model path {model_wts_path} does not exists!"
+        self.model = MobileNetV2_bottle(input_size=INPUT_WIDTH, width_mult=1.0)
+        self.model.load_state_dict(torch.load(model_wts_path, map_location="cpu"))
+        self.model.optimize_for_inference()
+
+        self.gpu = gpu and torch.cuda.is_available()
+        if self.gpu:
+            self.model.cuda()  # loads model to gpu
+            self.half = half
+            if self.half:
+                self.model.half()
+        else:
+            self.half = False
+
+        self.bgr = bgr
+        self.frame_width = frame_width
+        self.pooled_size = pooled_size
+        self._preprocessor = None
+
+        logger.info("MobileNetV2 RoI Align Embedder for Deep Sort initialised")
+        logger.info(f"- gpu enabled: {self.gpu}")
+        logger.info(f"- half precision: {self.half}")
+        logger.info(f"- frame width: {self.frame_width}")
+        logger.info(f"- expects BGR: {self.bgr}")
+
+        zeros = np.zeros((100, 100, 3), dtype=np.uint8)
+        self.predict(zeros, [[0, 0, 10, 10]])  # warmup
+
+    def _get_preprocessor(self, frame_shape):
+        """Preprocessor for frames of the given (H, W), together with the scale
+        from frame to network input coordinates. Rebuilt only when the frame
+        size changes."""
+        im_height, im_width = frame_shape[:2]
+        scale = min(1.0, self.frame_width / max(im_height, im_width))
+        input_width = max(self.stride, int(round(im_width * scale / self.stride)) * self.stride)
+        input_height = max(self.stride, int(round(im_height * scale / self.stride)) * self.stride)
+        pre = self._preprocessor
+        if pre is None or (pre.input_width, pre.input_height) != (input_width, input_height):
+            pre = BatchPreprocessor(1, input_width, bgr=self.bgr, input_height=input_height)
+            self._preprocessor = pre
+        return pre, (input_width / im_width, input_height / im_height)
+
+    def predict(self, frame, boxes):
+        """
+        Frame inference
+
+        Params
+        ------
+        frame : ndarray
+            (H x W x C), bgr or rgb according to self.bgr
+        boxes : list
+            detection boxes in frame coordinates, each [left, top, width, height]
+
+        Returns
+        ------
+        list of features (np.array with dim = 1280)
+
+        """
+        if len(boxes) == 0:
+            return []
+        pre, (scale_x, scale_y) = self._get_preprocessor(frame.shape)
+
+        rois = np.zeros((len(boxes), 5), dtype=np.float32)
+        ltwh = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        rois[:, 1] = ltwh[:, 0] * scale_x
+        rois[:, 2] = ltwh[:, 1] * scale_y
+        rois[:, 3] = (ltwh[:, 0] + ltwh[:, 2]) * scale_x
+        rois[:, 4] = (ltwh[:, 1] + ltwh[:, 3]) * scale_y
+
+        with torch.inference_mode():
+            this_batch = torch.from_numpy(pre([frame]))
+            rois = torch.from_numpy(rois)
             if self.gpu:
                 this_batch = this_batch.cuda()
+                rois = rois.cuda()
                 if self.half:
                     this_batch = this_batch.half()
-            output = self.model.forward(this_batch)
-
-            all_feats.extend(output.cpu().data.numpy())
-
-        return all_feats
+                    rois = rois.half()
+            fmap = self.model.feature_map(this_batch)
+            pooled = self._roi_align(
+                fmap,
+                rois,
+                output_size=self.pooled_size,
+                spatial_scale=1.0 / self.stride,
+                sampling_ratio=2,
+                aligned=True,
+            )
+            output = pooled.mean(dim=(2, 3))
+
+        return list(output.float().cpu().numpy())
 
 
 class TorchReID_Embedder(object):
@@ -1,27 +1,26 @@
 import os
 import logging
+from importlib import resources
 from pathlib import Path
 
 import cv2
 import numpy as np
-import pkg_resources
 import tensorflow as tf
 
-MOBILENETV2_BOTTLENECK_WTS = pkg_resources.resource_filename(
-    "deep_sort_realtime",
-    "embedder/weights/mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_224.h5",
+MOBILENETV2_BOTTLENECK_WTS = str(
+    resources.files("deep_sort_realtime")
+    / "embedder"
+    / "weights"
+    / "mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_224.h5"
 )
 
 logger = logging.getLogger(__name__)
 
-gpus = tf.config.experimental.list_physical_devices("GPU")
-if gpus:
-    # Currently, memory growth needs to be the same across GPUs
-    for gpu in gpus:
-        tf.config.experimental.set_memory_growth(gpu, True)
-
 INPUT_WIDTH = 224
 
+# Batch sizes with a traced graph; batches are padded up to the next one.
+BATCH_BUCKETS = (1, 2, 4, 8, 16)
+
 
 def batch(iterable, bs=1):
     l = len(iterable)
@@ -29,6 +28,20 @@ def batch(iterable, bs=1):
         yield iterable[ndx : min(ndx + bs, l)]
 
 
+def enable_gpu_memory_growth():
+    """Let TF allocate GPU memory as needed instead of all of it upfront. Only
+    has an effect before the GPUs are initialised, i.e. before the first model
+    is built."""
+    gpus = tf.config.experimental.list_physical_devices("GPU")
+    # Currently, memory growth needs to be the same across GPUs
+    for gpu in gpus:
+        try:
+            tf.config.experimental.set_memory_growth(gpu, True)
+        except RuntimeError:
+            logger.warning("GPUs already initialised, could not enable memory growth")
+            break
+
+
 def get_mobilenetv2_with_preproc(wts="imagenet"):
     i = tf.keras.layers.Input([None, None, 3], dtype=tf.uint8)
     x = tf.cast(i, tf.float32)
@@ -44,7 +57,6 @@ def get_mobilenetv2_with_preproc(wts="imagenet"):
     x = core_model(x)
 
     model = tf.keras.Model(inputs=[i], outputs=[x])
-    model.summary()
     return model
 
 
@@ -52,6 +64,8 @@ class MobileNetv2_Embedder(object):
     """
     MobileNetv2_Embedder loads a Mobilenetv2 pretrained on Imagenet1000, with classification layer removed, exposing the bottleneck layer, outputing a feature of size 1280.
 
+    Inference runs through a `tf.function` traced once per batch size bucket (BATCH_BUCKETS up to max_batch_size) with a fixed input signature, batches being padded up to the next bucket, so it never retraces. Crops are resized into a reused uint8 buffer; BGR to RGB flip, casting and normalisation happen inside the graph.
+
     Params
     ------
     - model_wts_path (optional, str) : path to mobilenetv2 model weights, defaults to the model file in ./mobilenetv2
@@ -64,6 +78,8 @@ class MobileNetv2_Embedder(object):
 
         if not gpu:
             os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+        else:
+            enable_gpu_memory_growth()
 
         if model_wts_path is None:
             model_wts_path = MOBILENETV2_BOTTLENECK_WTS
@@ -77,12 +93,30 @@ class MobileNetv2_Embedder(object):
         self.max_batch_size = max_batch_size
         self.bgr = bgr
 
+        self._buffer = np.zeros(
+            (max_batch_size, INPUT_WIDTH, INPUT_WIDTH, 3), dtype=np.uint8
+        )
+        self._buckets = [b for b in BATCH_BUCKETS if b < max_batch_size] + [max_batch_size]
+        embed = tf.function(self._embed_graph)
+        self._embed = {
+            b: embed.get_concrete_function(
+                tf.TensorSpec([b, INPUT_WIDTH, INPUT_WIDTH, 3], dtype=tf.uint8)
+            )
+            for b in self._buckets
+        }
+
         logger.info("MobileNetV2 Embedder (tf) for Deep Sort initialised")
         logger.info(f"- max batch size: {self.max_batch_size}")
         logger.info(f"- expects BGR: {self.bgr}")
 
         zeros = np.zeros((100, 100, 3), dtype=np.uint8)
-        self.predict([zeros, zeros])  # warmup
+        for b in self._buckets:
+            self.predict([zeros] * b)  # warmup
+
+    def _embed_graph(self, batch):
+        if self.bgr:
+            batch = tf.reverse(batch, axis=[-1])
+        return self.model(batch, training=False)
 
     def preprocess(self, np_image):
         """
@@ -119,11 +153,13 @@ class MobileNetv2_Embedder(object):
         """
         all_feats = []
 
-        preproc_imgs = [self.preprocess(img) for img in np_images]
-
-        for this_batch in batch(preproc_imgs, bs=self.max_batch_size):
-            this_batch = tf.stack(this_batch, axis=0)
-            output = self.model(this_batch)
-            all_feats.extend(output.numpy())
+        for this_batch in batch(np_images, bs=self.max_batch_size):
+            n = len(this_batch)
+            for np_image, dst in zip(this_batch, self._buffer):
+                cv2.resize(np_image, (INPUT_WIDTH, INPUT_WIDTH), dst=dst)
+            # Rows past n hold stale crops; their features are dropped.
+            bucket = next(b for b in self._buckets if b >= n)
+            output = self._embed[bucket](tf.convert_to_tensor(self._buffer[:bucket]))
+            all_feats.extend(output.numpy()[:n])
 
         return all_feats
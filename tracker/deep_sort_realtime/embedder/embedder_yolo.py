@@ -0,0 +1,129 @@
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class YOLOv8_Neck_Embedder(object):
+    """
+    YOLOv8_Neck_Embedder reuses the feature maps of an ultralytics YOLOv8 detector as appearance features, so that no second network runs per frame. A hook on the Detect head keeps its inputs (the P3-P5 neck outputs) from the latest detection pass; `predict` then pools a vector per box from each level with RoI Align and concatenates the L2-normalised level vectors (64 + 128 + 256 = 448 dims for yolov8n).
+
+    Call `predict` right after running the detector on the frame, before running it on the next one, and give the result to `DeepSort.update_tracks` as `embeds`. The features differ from the MobileNetV2 ones, so max_cosine_distance may need retuning.
+
+    Params
+    ------
+    - yolo_model (ultralytics.YOLO) : the detector, or its underlying DetectionModel
+    - pooled_size (optional, int) : side of the RoI Align output grid, which is then averaged into one vector per level, defaults to 2
+    - levels (optional, list of int) : indices of the Detect inputs to use, defaults to all of them
+    """
+
+    takes_boxes = True
+
+    def __init__(self, yolo_model, pooled_size=2, levels=None):
+        try:
+            from torchvision.ops import roi_align
+        except ImportError:
+            raise Exception('ImportError: torchvision is not installed, please install and try again or choose another embedder')
+        self._roi_align = roi_align
+
+        # ultralytics.YOLO wraps a DetectionModel whose `model` is the layer
+        # sequence, ending with the Detect head.
+        detection_model = yolo_model
+        if not isinstance(getattr(detection_model, "model", None), torch.nn.Sequential):
+            detection_model = getattr(detection_model, "model", None)
+        if not isinstance(getattr(detection_model, "model", None), torch.nn.Sequential):
+            raise Exception("YOLOv8_Neck_Embedder needs a torch (.pt) YOLOv8 model")
+        self.detect = detection_model.model[-1]
+        self.strides = [float(s) for s in self.detect.stride]
+        self.levels = list(range(len(self.strides))) if levels is None else list(levels)
+        self.pooled_size = pooled_size
+        self._feats = None
+        self._hook = self.detect.register_forward_pre_hook(self._capture)
+
+        logger.info("YOLOv8 Neck Embedder for Deep Sort initialised")
+        logger.info(f"- levels (strides): {[self.strides[i] for i in self.levels]}")
+
+    def _capture(self, module, args):
+        # Detect overwrites the entries of its input list in place, so keep
+        # the tensors in a list of our own.
+        self._feats = list(args[0])
+
+    def remove(self):
+        """Remove the hook from the detector."""
+        self._hook.remove()
+
+    @staticmethod
+    def letterbox_transform(frame_shape, input_shape):
+        """
+        Gain and (left, top) padding of the ultralytics letterbox mapping frame coordinates to network input coordinates, as inverted by `ultralytics.utils.ops.scale_boxes`.
+
+        Parameters
+        ----------
+        frame_shape : tuple
+            (H, W) of the original frame
+        input_shape : tuple
+            (H, W) of the network input
+
+        Returns
+        -------
+        float, tuple of float
+
+        """
+        gain = min(input_shape[0] / frame_shape[0], input_shape[1] / frame_shape[1])
+        pad_x = round((input_shape[1] - frame_shape[1] * gain) / 2 - 0.1)
+        pad_y = round((input_shape[0] - frame_shape[0] * gain) / 2 - 0.1)
+        return gain, (pad_x, pad_y)
+
+    def predict(self, frame, boxes, image_index=0):
+        """
+        Pool appearance features from the latest detection pass
+
+        Params
+        ------
+        frame : ndarray
+            (H x W x C) the frame the detector last ran on, only its shape is used
+        boxes : list
+            detection boxes in frame coordinates, each [left, top, width, height]
+        image_index (optional, int) : index of the frame in the detector's last batch, defaults to 0
+
+        Returns
+        ------
+        list of features (np.array)
+
+        """
+        if self._feats is None:
+            raise Exception("The detector has not run yet, no features to pool from")
+        if len(boxes) == 0:
+            return []
+
+        level0 = self._feats[self.levels[0]]
+        stride0 = self.strides[self.levels[0]]
+        input_shape = (level0.shape[2] * stride0, level0.shape[3] * stride0)
+        gain, (pad_x, pad_y) = self.letterbox_transform(frame.shape[:2], input_shape)
+
+        rois = np.zeros((len(boxes), 5), dtype=np.float32)
+        ltwh = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        rois[:, 1] = ltwh[:, 0] * gain + pad_x
+        rois[:, 2] = ltwh[:, 1] * gain + pad_y
+        rois[:, 3] = (ltwh[:, 0] + ltwh[:, 2]) * gain + pad_x
+        rois[:, 4] = (ltwh[:, 1] + ltwh[:, 3]) * gain + pad_y
+
+        with torch.inference_mode():
+            rois = torch.from_numpy(rois).to(level0.device)
+            vectors = []
+            for level in self.levels:
+                fmap = self._feats[level][image_index : image_index + 1].float()
+                pooled = self._roi_align(
+                    fmap,
+                    rois,
+                    output_size=self.pooled_size,
+                    spatial_scale=1.0 / self.strides[level],
+                    sampling_ratio=2,
+                    aligned=True,
+                ).mean(dim=(2, 3))
+                vectors.append(torch.nn.functional.normalize(pooled, dim=1))
+            output = torch.cat(vectors, dim=1)
+
+        return list(output.cpu().numpy())
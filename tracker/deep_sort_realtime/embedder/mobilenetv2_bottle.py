@@ -1,4 +1,6 @@
+import torch
 import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 import math
 
 
@@ -18,6 +20,27 @@ def conv_1x1_bn(inp, oup):
     )
 
 
+def fold_bn(sequential):
+    """Return a copy of `sequential` where every Conv2d directly followed by a
+    BatchNorm2d is replaced by a single Conv2d with the (eval mode) batch norm
+    folded into its weights and bias."""
+    layers = list(sequential)
+    folded = []
+    i = 0
+    while i < len(layers):
+        if (
+            isinstance(layers[i], nn.Conv2d)
+            and i + 1 < len(layers)
+            and isinstance(layers[i + 1], nn.BatchNorm2d)
+        ):
+            folded.append(fuse_conv_bn_eval(layers[i], layers[i + 1]))
+            i += 2
+        else:
+            folded.append(layers[i])
+            i += 1
+    return nn.Sequential(*folded)
+
+
 class InvertedResidual(nn.Module):
     def __init__(self, inp, oup, stride, expand_ratio):
         super(InvertedResidual, self).__init__()
@@ -112,8 +135,43 @@ class MobileNetV2_bottle(nn.Module):
         # )
 
         self._initialize_weights()
+        self.inference_only = False
+
+    def optimize_for_inference(self):
+        """
+        Prepare the network for inference only: folds every batch norm into the preceding convolution, switches weights (and inputs in `forward`) to channels_last memory format, and makes `forward` run under `torch.inference_mode`. Outputs are unchanged up to floating point error. Load weights before calling this, the folded network no longer has batch norm entries in its state dict.
+
+        Returns
+        -------
+        self
+        """
+        self.eval()
+        for i, module in enumerate(self.features):
+            if isinstance(module, InvertedResidual):
+                module.conv = fold_bn(module.conv)
+            else:
+                self.features[i] = fold_bn(module)
+        self.to(memory_format=torch.channels_last)
+        self.requires_grad_(False)
+        self.inference_only = True
+        return self
 
     def forward(self, x):
+        if self.inference_only:
+            with torch.inference_mode():
+                return self._forward(x.contiguous(memory_format=torch.channels_last))
+        return self._forward(x)
+
+    def feature_map(self, x):
+        """
+        Bottleneck feature map before global pooling, (N x 1280 x H/32 x W/32). Runs under `torch.inference_mode` after `optimize_for_inference`.
+        """
+        if self.inference_only:
+            with torch.inference_mode():
+                return self.features(x.contiguous(memory_format=torch.channels_last))
+        return self.features(x)
+
+    def _forward(self, x):
         x = self.features(x)
         x = x.mean(3).mean(2)
         # x = self.classifier(x)
@@ -0,0 +1,142 @@
+import os
+
+import cv2
+import numpy as np
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# Normalisation of CLIP's image transform.
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# Colour filled in outside instance masks (imagenet mean, in the crop's own
+# channel order, as uint8).
+MASK_FILL = np.array([123.675, 116.28, 103.53]).astype(np.uint8)
+
+
+def load_crops(source, bgr=True):
+    """
+    Load crops, e.g. recorded detection crops used to calibrate a quantized embedder.
+
+    Parameters
+    ----------
+    source : str or list
+        A directory of image files (read in sorted order), or a list whose items are image paths or (H x W x C) ndarrays already in the embedder's colour order.
+    bgr : bool
+        Colour order for images read from file, defaults to True
+
+    Returns
+    -------
+    list of ndarray
+        (H x W x C) crops
+
+    """
+    if isinstance(source, str):
+        assert os.path.isdir(source), f"Crop directory {source} does not exist!"
+        source = [
+            os.path.join(source, name)
+            for name in sorted(os.listdir(source))
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+    crops = []
+    for item in source:
+        if isinstance(item, str):
+            crop = cv2.imread(item)
+            assert crop is not None, f"Could not read crop {item}"
+            item = crop if bgr else cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        crops.append(item)
+    return crops
+
+
+class BatchPreprocessor(object):
+    """
+    Batched preprocessing of crops into a normalised NCHW float32 batch, done in buffers that are allocated once and reused across frames. Crops are resized straight into a uint8 buffer, then the BGR to RGB flip, HWC to CHW transpose, scaling to [0, 1] and mean/std normalisation are done by one vectorised multiply-add into the output buffer. Crops given with a foreground mask are first composited over the fill colour in a scratch buffer that grows to the largest crop seen, so the frame is left untouched and nothing is allocated per crop.
+
+    Params
+    ------
+    - max_batch_size (int) : maximum number of crops per call
+    - input_width (int) : width of the network input
+    - input_height (optional, int) : height of the network input, defaults to input_width (square)
+    - bgr (optional, Bool) : boolean flag indicating if input crops are bgr or not, defaults to True
+    - mean (optional, array) : per channel (RGB) mean, defaults to imagenet
+    - std (optional, array) : per channel (RGB) standard deviation, defaults to imagenet
+    """
+
+    def __init__(
+        self,
+        max_batch_size,
+        input_width,
+        bgr=True,
+        mean=IMAGENET_MEAN,
+        std=IMAGENET_STD,
+        input_height=None,
+    ):
+        if input_height is None:
+            input_height = input_width
+        self.max_batch_size = max_batch_size
+        self.input_width = input_width
+        self.input_height = input_height
+        self.bgr = bgr
+
+        self._resized = np.empty(
+            (max_batch_size, input_height, input_width, 3), dtype=np.uint8
+        )
+        self._batch = np.empty(
+            (max_batch_size, 3, input_height, input_width), dtype=np.float32
+        )
+        self._scratch = np.empty(0, dtype=np.uint8)
+        mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        self._scale = (1.0 / (255.0 * std))[None, :, None, None]
+        self._shift = (-mean / std)[None, :, None, None]
+
+    def _scratch_image(self, shape):
+        """(H x W x C) uint8 view of the scratch buffer, grown if needed."""
+        size = int(np.prod(shape))
+        if self._scratch.size < size:
+            self._scratch = np.empty(size, dtype=np.uint8)
+        return self._scratch[:size].reshape(shape)
+
+    def _composite(self, np_image, mask, fill):
+        out = self._scratch_image(np_image.shape)
+        out[...] = fill
+        mask = np.asarray(mask)
+        if mask.dtype != bool:
+            mask = mask != 0
+        np.copyto(out, np_image, where=mask[..., None])
+        return out
+
+    def __call__(self, np_images, masks=None, fill=MASK_FILL):
+        """
+        Parameters
+        ----------
+        np_images : list of ndarray
+            At most `max_batch_size` images of (H x W x C)
+        masks : list, optional
+            Per image, None or a (H x W) mask of its foreground (boolean, or nonzero foreground). Pixels outside it are replaced by `fill`.
+        fill : array_like
+            Background colour, in the images' channel order
+
+        Returns
+        -------
+        ndarray
+            (B x C x H x W) float32. Shares memory with the output buffer, which is overwritten by the next call.
+
+        """
+        n = len(np_images)
+        size = (self.input_width, self.input_height)
+        resized = self._resized[:n]
+        for i, (np_image, dst) in enumerate(zip(np_images, resized)):
+            if masks is not None and masks[i] is not None:
+                np_image = self._composite(np_image, masks[i], fill)
+            cv2.resize(np_image, size, dst=dst)
+
+        if self.bgr:
+            resized = resized[..., ::-1]
+        batch = self._batch[:n]
+        np.multiply(resized.transpose(0, 3, 1, 2), self._scale, out=batch)
+        batch += self._shift
+        return batch
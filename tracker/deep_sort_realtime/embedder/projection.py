@@ -0,0 +1,139 @@
+"""Learned linear projection of appearance features to fewer dimensions.
+
+A projection is stored as a (D+1 x k) float32 `.npy` matrix: the first D rows
+are the linear map and the last row the offset, so that a (N x D) batch of
+features maps to `features @ matrix[:-1] + matrix[-1]`. Fit one from recorded
+embeddings of the embedder in use with:
+
+    python -m deep_sort_realtime.embedder.projection recorded.npz pca128.npy --dim 128
+
+and give it to `DeepSort(embedder_projection="pca128.npy")`.
+"""
+import argparse
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def fit_projection(features, dim=128, whiten=False, eps=1e-6):
+    """
+    Fit a PCA projection (optionally whitening) of features.
+
+    Parameters
+    ----------
+    features : array_like
+        (N x D) recorded features, ideally from many identities and cameras.
+    dim : int
+        Number of principal components to keep, at most D.
+    whiten : bool
+        If True, the components are scaled to unit variance.
+    eps : float
+        Added to the variances before whitening, so near empty components are
+        not blown up.
+
+    Returns
+    -------
+    ndarray
+        (D+1 x dim) float32 projection matrix, last row being the offset.
+
+    """
+    features = np.asarray(features, dtype=np.float64)
+    if features.ndim != 2:
+        raise ValueError(f"Expected (N x D) features, got shape {features.shape}")
+    if not 0 < dim <= features.shape[1]:
+        raise ValueError(f"Cannot keep {dim} of {features.shape[1]} dimensions")
+    if len(features) < dim:
+        logger.warning(f"Fitting {dim} components on only {len(features)} features")
+
+    mean = features.mean(axis=0)
+    covariance = np.cov(features - mean, rowvar=False)
+    variances, components = np.linalg.eigh(covariance)
+    order = np.argsort(variances)[::-1][:dim]
+    variances, components = variances[order], components[:, order]
+    if whiten:
+        components = components / np.sqrt(np.maximum(variances, 0.0) + eps)
+
+    explained = variances.sum() / max(np.trace(covariance), np.finfo(float).tiny)
+    logger.info(f"Projection to {dim} dims keeps {explained:.1%} of the variance")
+
+    matrix = np.empty((features.shape[1] + 1, dim), dtype=np.float32)
+    matrix[:-1] = components
+    matrix[-1] = -mean @ components
+    return matrix
+
+
+class FeatureProjection(object):
+    """
+    Applies a projection matrix fitted by `fit_projection` to batches of features.
+
+    Params
+    ------
+    - matrix (str or ndarray) : path to a saved (.npy) projection matrix, or the (D+1 x k) matrix itself
+    """
+
+    def __init__(self, matrix):
+        if isinstance(matrix, (str, os.PathLike)):
+            matrix = np.load(matrix)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) < 2:
+            raise ValueError(f"Expected a (D+1 x k) projection matrix, got shape {matrix.shape}")
+        self.weight = np.ascontiguousarray(matrix[:-1])
+        self.bias = matrix[-1].copy()
+
+    @property
+    def in_dim(self):
+        return self.weight.shape[0]
+
+    @property
+    def out_dim(self):
+        return self.weight.shape[1]
+
+    def __call__(self, features):
+        """
+        Parameters
+        ----------
+        features : array_like
+            (N x D) features
+
+        Returns
+        -------
+        ndarray
+            (N x k) float32 projected features
+
+        """
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self.in_dim)
+        projected = features @ self.weight
+        projected += self.bias
+        return projected
+
+
+def load_features(path):
+    """(N x D) features from a `.npy` array, or the `features` array of a `.npz`."""
+    data = np.load(path)
+    if isinstance(data, np.lib.npyio.NpzFile):
+        data = data["features"]
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit a PCA projection of appearance features and save it as .npy"
+    )
+    parser.add_argument("features", help="recorded features, (N x D) .npy or .npz with a `features` array")
+    parser.add_argument("output", help="path of the projection matrix (.npy)")
+    parser.add_argument("--dim", type=int, default=128, help="dimensions to keep")
+    parser.add_argument("--whiten", action="store_true", help="scale components to unit variance")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    features = load_features(args.features)
+    matrix = fit_projection(features, dim=args.dim, whiten=args.whiten)
+    np.save(args.output, matrix)
+    logger.info(f"Saved {features.shape[1]} -> {args.dim} projection fitted on {len(features)} features to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def decode_rle(rle):
+    """Decode a COCO uncompressed run-length encoding.
+
+    Parameters
+    ----------
+    rle : dict
+        {"size": [height, width], "counts": [...]}, where counts alternate
+        runs of 0s and 1s (starting with 0s) over the mask in column-major
+        order.
+
+    Returns
+    -------
+    ndarray
+        The (height x width) boolean mask.
+
+    """
+    height, width = rle["size"]
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        raise Exception(
+            "Compressed RLE is not supported, decode it first (e.g. pycocotools.mask.decode)"
+        )
+    counts = np.asarray(counts, dtype=np.int64)
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    flat = np.repeat(values, counts)
+    if flat.size != height * width:
+        raise Exception(
+            f"RLE counts sum to {flat.size}, expected {height} x {width}"
+        )
+    return flat.reshape(width, height).T
+
+
+def crop_mask(mask, box, crop_box, frame_shape):
+    """Part of an instance mask within the crop of a detection.
+
+    The mask may cover the full frame, or only the detection box (as
+    segmenters that output per-box masks give them), either as an array or as
+    a COCO uncompressed RLE. Arrays are sliced, not copied.
+
+    Parameters
+    ----------
+    mask : ndarray or dict
+        (H x W) mask of the frame, (h x w) mask of the box, or an RLE of
+        either.
+    box : array_like
+        Integer detection box (left, top, right, bottom), which may extend
+        past the frame.
+    crop_box : array_like
+        The box clipped to the frame, (left, top, right, bottom).
+    frame_shape : tuple
+        (H, W, ...) shape of the frame.
+
+    Returns
+    -------
+    ndarray
+        The mask of the crop, shaped like `frame[top:bottom, left:right]` of
+        the crop box.
+
+    """
+    if isinstance(mask, dict):
+        mask = decode_rle(mask)
+    l, t, r, b = box
+    crop_l, crop_t, crop_r, crop_b = crop_box
+    if mask.shape[:2] == tuple(frame_shape[:2]):
+        return mask[crop_t:crop_b, crop_l:crop_r]
+    if mask.shape[:2] == (b - t, r - l):
+        return mask[crop_t - t : crop_b - t, crop_l - l : crop_r - l]
+    raise Exception(
+        f"Instance mask of shape {mask.shape[:2]} matches neither the frame "
+        f"{tuple(frame_shape[:2])} nor its box {(b - t, r - l)}"
+    )
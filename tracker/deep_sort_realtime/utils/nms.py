@@ -1,11 +1,30 @@
 import numpy as np
 
+# Rows of the pairwise overlap block computed per step, bounding the
+# temporaries to _CHUNK_ROWS x (boxes within reach) elements.
+_CHUNK_ROWS = 64
+# Above this many boxes within reach of a box on average (dense scenes),
+# listing every overlapping pair costs more than a greedy loop over the kept
+# boxes, whose suppressions shrink the work as it goes.
+_MAX_MEAN_REACH = 500
 
-def non_max_suppression(boxes, max_bbox_overlap, scores=None):
+
+def non_max_suppression(boxes, max_bbox_overlap, scores=None, classes=None):
     """Suppress overlapping detections.
     Original code from [1]_ has been adapted to include confidence score.
     .. [1] http://www.pyimagesearch.com/2015/02/16/
            faster-non-maximum-suppression-python/
+
+    Only boxes close enough to overlap are compared: boxes are swept in
+    left-edge order, so those within reach of a box form one contiguous
+    window. The pairs where one box suppresses another are then listed as
+    index arrays and the greedy suppression is resolved in vectorized rounds
+    over them, without a loop over boxes. In dense scenes, where listing all
+    pairs costs more, boxes are visited greedily instead, each kept box
+    suppressing the boxes within its window at once. If `classes` is given,
+    only detections of the same class suppress each other (e.g. a bicycle
+    never suppresses a motorcycle).
+
     Examples
     --------
         >>> boxes = [d.roi for d in detections]
@@ -20,6 +39,9 @@ def non_max_suppression(boxes, max_bbox_overlap, scores=None):
         ROIs that overlap more than this values are suppressed.
     scores : Optional[array_like]
         Detector confidence score.
+    classes : Optional[array_like]
+        Detection class labels (any hashable values). If given, suppression is
+        done per class.
     Returns
     -------
     List[int]
@@ -28,8 +50,7 @@ def non_max_suppression(boxes, max_bbox_overlap, scores=None):
     if len(boxes) == 0:
         return []
 
-    boxes = boxes.astype(np.float32)
-    pick = []
+    boxes = np.asarray(boxes, dtype=np.float32)
 
     x1 = boxes[:, 0]
     y1 = boxes[:, 1]
@@ -37,28 +58,121 @@ def non_max_suppression(boxes, max_bbox_overlap, scores=None):
     y2 = boxes[:, 3] + boxes[:, 1]
 
     area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    # Overlap is measured relative to the area of the suppressed box, so
+    # `overlap > max_bbox_overlap` becomes `intersection > max_area`.
+    max_area = max_bbox_overlap * area
     if scores is not None:
-        idxs = np.argsort(scores)
+        order = np.argsort(scores)
+    else:
+        order = np.argsort(y2)
+    # rank[i] is the position of box i in the greedy visiting order.
+    rank = np.empty(len(boxes), dtype=int)
+    rank[order[::-1]] = np.arange(len(boxes))
+
+    if classes is None:
+        groups = [np.arange(len(boxes))]
+    else:
+        codes = {}
+        labels = np.array([codes.setdefault(c, len(codes)) for c in classes])
+        groups = [np.flatnonzero(labels == label) for label in range(len(codes))]
+
+    pick = np.concatenate(
+        [_suppress_group(x1, y1, x2, y2, max_area, rank, group) for group in groups]
+    )
+    return pick[np.argsort(rank[pick])].tolist()
+
+
+def _suppress_group(x1, y1, x2, y2, max_area, rank, group):
+    """Indices of the boxes of `group` kept by greedy suppression within it."""
+    # Work in left-edge order, so that the boxes a box (or a chunk of them)
+    # can overlap form one contiguous window.
+    by_x = group[np.argsort(x1[group], kind="stable")]
+    x1, y1, x2, y2 = x1[by_x], y1[by_x], x2[by_x], y2[by_x]
+    max_area, rank = max_area[by_x], rank[by_x]
+    max_width = (x2 - x1).max()
+    lo = np.searchsorted(x1, x1 - max_width - 1)
+    hi = np.searchsorted(x1, x2 + 1)
+
+    if (hi - lo).mean() > _MAX_MEAN_REACH:
+        kept = _greedy(x1, y1, x2, y2, max_area, rank, lo, hi)
     else:
-        idxs = np.argsort(y2)
+        kept = _resolve(len(by_x), *_suppression_pairs(x1, y1, x2, y2, max_area, rank, lo, hi))
+    return by_x[kept]
+
+
+def _overlaps(x1, y1, x2, y2, max_area, rows, cols):
+    """Whether each box of the slice `rows` overlaps more than `max_area` of
+    each box of the slice `cols`."""
+    w = np.minimum(x2[rows, None], x2[None, cols])
+    w -= np.maximum(x1[rows, None], x1[None, cols])
+    w += 1
+    np.maximum(w, 0, out=w)
+    h = np.minimum(y2[rows, None], y2[None, cols])
+    h -= np.maximum(y1[rows, None], y1[None, cols])
+    h += 1
+    np.maximum(h, 0, out=h)
+    w *= h
+    return w > max_area[None, cols]
 
-    while len(idxs) > 0:
-        last = len(idxs) - 1
-        i = idxs[last]
-        pick.append(i)
 
-        xx1 = np.maximum(x1[i], x1[idxs[:last]])
-        yy1 = np.maximum(y1[i], y1[idxs[:last]])
-        xx2 = np.minimum(x2[i], x2[idxs[:last]])
-        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+def _suppression_pairs(x1, y1, x2, y2, max_area, rank, lo, hi):
+    """Pairs (p, q) where p comes first in visiting order and overlaps more
+    than `max_area[q]` of q, as two index arrays."""
+    src, dst = [], []
+    n = len(x1)
+    for start in range(0, n, _CHUNK_ROWS):
+        stop = min(start + _CHUNK_ROWS, n)
+        rows, cols = slice(start, stop), slice(lo[start], hi[start:stop].max())
+        block = _overlaps(x1, y1, x2, y2, max_area, rows, cols)
+        # Only a box visited earlier can suppress a later one.
+        block &= rank[rows, None] < rank[None, cols]
+        p, q = np.nonzero(block)
+        src.append(p + start)
+        dst.append(q + cols.start)
+    return np.concatenate(src), np.concatenate(dst)
 
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
 
-        overlap = (w * h) / area[idxs[:last]]
+def _resolve(n, src, dst):
+    """Boxes kept by greedy suppression, given the pairs where src[e]
+    suppresses dst[e] if src[e] is kept."""
+    # A box is kept once no undecided box can suppress it, and suppressed once
+    # a kept box does. The first undecided box in visiting order is always
+    # kept, so every round decides at least one box; in practice the rounds
+    # are as few as the longest chain of suppressions.
+    kept = np.zeros(n, dtype=bool)
+    decided = np.zeros(n, dtype=bool)
+    while not decided.all():
+        blocked = np.zeros(n, dtype=bool)
+        blocked[dst[~decided[src]]] = True
+        kept |= ~decided & ~blocked
+        decided |= kept
+        decided[dst[kept[src]]] = True
+        # pairs that can still decide something
+        alive = ~decided[dst] & (~decided[src] | kept[src])
+        src, dst = src[alive], dst[alive]
+    return np.flatnonzero(kept)
 
-        idxs = np.delete(
-            idxs, np.concatenate(([last], np.where(overlap > max_bbox_overlap)[0]))
-        )
 
-    return pick
+def _greedy(x1, y1, x2, y2, max_area, rank, lo, hi):
+    """Boxes kept by visiting them in order and letting each kept box
+    suppress the later boxes within its window."""
+    visit = np.argsort(rank)
+    position = np.empty_like(visit)
+    position[visit] = np.arange(len(visit))
+    # alive[v]: the v-th box in visiting order is not suppressed (yet)
+    alive = np.ones(len(visit), dtype=bool)
+    kept = []
+    v = 0
+    while True:
+        p = visit[v]
+        kept.append(p)
+        alive[v] = False
+        cols = slice(lo[p], hi[p])
+        w = np.minimum(x2[p], x2[cols]) - np.maximum(x1[p], x1[cols]) + 1
+        h = np.minimum(y2[p], y2[cols]) - np.maximum(y1[p], y1[cols]) + 1
+        hit = np.maximum(w, 0) * np.maximum(h, 0) > max_area[cols]
+        # earlier boxes in the window are already kept or suppressed
+        alive[position[cols][hit]] = False
+        v += np.argmax(alive[v:])
+        if not alive[v]:
+            return np.array(kept)
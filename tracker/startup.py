@@ -0,0 +1,53 @@
+# 启动编排：并行加载检测模型、初始化跟踪器（含外观特征模型的加载与预热）、打开摄像头，
+# 缩短进程（如崩溃后被看门狗重启）到处理第一帧的时间
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def load_detector(model_path, warmup_shape=(480, 640, 3)):
+    """加载 YOLO 模型，并用空白帧预热（首次推理需要初始化，耗时较长）"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    model(np.zeros(warmup_shape, dtype=np.uint8), verbose=False)
+    return model
+
+
+def create_tracker(**deepsort_kwargs):
+    """初始化 DeepSORT，内置外观特征模型在此加载并预热（参数同 DeepSort）"""
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    return DeepSort(**deepsort_kwargs)
+
+
+def open_camera(source=0):
+    """打开摄像头，并抓取一帧让摄像头开始出图（部分 USB 摄像头第一帧很慢）"""
+    import cv2
+
+    cap = cv2.VideoCapture(source)
+    if cap.isOpened():
+        cap.grab()
+    return cap
+
+
+def parallel_startup(tasks):
+    """
+    并行执行启动任务（模型加载、推理与摄像头 I/O 大多释放 GIL，线程即可并行）
+
+    参数 tasks: {名称: 无参函数}
+    返回 ({名称: 结果}, {名称: 耗时(秒)})，任一任务失败则抛出其异常
+    """
+    timings = {}
+
+    def timed(name, fn):
+        tic = time.perf_counter()
+        result = fn()
+        timings[name] = time.perf_counter() - tic
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="startup") as pool:
+        futures = {name: pool.submit(timed, name, fn) for name, fn in tasks.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    return results, timings
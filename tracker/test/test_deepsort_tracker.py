@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from deep_sort_realtime.deepsort_tracker import DeepSort
+
+DETECTIONS = [([10, 10, 40, 60], 0.9, "bicycle"), ([200, 100, 40, 60], 0.9, "bicycle")]
+
+
+class FailingEmbedder(object):
+    """Embeds the first `n_ok` calls, then raises."""
+
+    def __init__(self, n_ok):
+        self.n_ok = n_ok
+
+    def predict(self, crops):
+        if self.n_ok == 0:
+            raise RuntimeError("embedder failed")
+        self.n_ok -= 1
+        return [np.ones(8) for _ in crops]
+
+
+def test_tracks_are_not_aged_when_embedding_fails():
+    tracker = DeepSort(embedder=None, n_init=1)
+    tracker.embedder = FailingEmbedder(n_ok=1)
+    frame = np.zeros((300, 300, 3), dtype=np.uint8)
+    tracks = tracker.update_tracks(DETECTIONS, frame=frame)
+    ages = [(t.age, t.time_since_update) for t in tracks]
+    with pytest.raises(RuntimeError):
+        tracker.update_tracks(DETECTIONS, frame=frame)
+    assert [(t.age, t.time_since_update) for t in tracker.tracker.tracks] == ages
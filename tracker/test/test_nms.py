@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from deep_sort_realtime.utils import nms
+from deep_sort_realtime.utils.nms import non_max_suppression
+
+
+@pytest.fixture(autouse=True, params=["pairs", "greedy"])
+def engine(request, monkeypatch):
+    """Runs each test with both ways of resolving the suppression."""
+    reach = {"pairs": np.inf, "greedy": -1}[request.param]
+    monkeypatch.setattr(nms, "_MAX_MEAN_REACH", reach)
+
+
+def reference_nms(boxes, max_bbox_overlap, scores=None):
+    """The np.delete based loop non_max_suppression replaced."""
+    if len(boxes) == 0:
+        return []
+
+    boxes = boxes.astype(np.float32)
+    pick = []
+
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = boxes[:, 2] + boxes[:, 0]
+    y2 = boxes[:, 3] + boxes[:, 1]
+
+    area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    if scores is not None:
+        idxs = np.argsort(scores)
+    else:
+        idxs = np.argsort(y2)
+
+    while len(idxs) > 0:
+        last = len(idxs) - 1
+        i = idxs[last]
+        pick.append(i)
+
+        xx1 = np.maximum(x1[i], x1[idxs[:last]])
+        yy1 = np.maximum(y1[i], y1[idxs[:last]])
+        xx2 = np.minimum(x2[i], x2[idxs[:last]])
+        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+
+        overlap = (w * h) / area[idxs[:last]]
+
+        idxs = np.delete(
+            idxs, np.concatenate(([last], np.where(overlap > max_bbox_overlap)[0]))
+        )
+
+    return pick
+
+
+def clustered_boxes(n, rng):
+    """Jittered copies of a few objects, as a detector outputs before NMS."""
+    centers = rng.uniform(0, 1000, (max(1, n // 10), 2))
+    sizes = rng.uniform(20, 200, (len(centers), 2))
+    which = rng.integers(0, len(centers), n)
+    wh = sizes[which] * rng.uniform(0.7, 1.3, (n, 2))
+    xy = centers[which] - wh / 2 + rng.normal(0, 10, (n, 2))
+    return np.hstack([xy, wh])
+
+
+@pytest.mark.parametrize("n", [1, 2, 30, 300, 1000])
+@pytest.mark.parametrize("max_bbox_overlap", [0.3, 0.7, 1.0])
+@pytest.mark.parametrize("with_scores", [True, False])
+def test_matches_reference(n, max_bbox_overlap, with_scores):
+    rng = np.random.default_rng(n)
+    boxes = clustered_boxes(n, rng)
+    scores = rng.uniform(0.3, 1.0, n) if with_scores else None
+    assert non_max_suppression(boxes, max_bbox_overlap, scores) == reference_nms(
+        boxes, max_bbox_overlap, scores
+    )
+
+
+def test_classes_are_suppressed_separately():
+    rng = np.random.default_rng(0)
+    boxes = clustered_boxes(500, rng)
+    scores = rng.uniform(0.3, 1.0, len(boxes))
+    classes = rng.choice(["bicycle", "motorcycle"], len(boxes))
+    expected = []
+    for label in ("bicycle", "motorcycle"):
+        group = np.flatnonzero(classes == label)
+        expected.extend(group[reference_nms(boxes[group], 0.5, scores[group])])
+    pick = non_max_suppression(boxes, 0.5, scores, classes)
+    assert sorted(pick) == sorted(expected)
+    # still in order of decreasing score
+    assert np.all(np.diff(scores[pick]) <= 0)
+
+
+def test_empty():
+    assert non_max_suppression(np.zeros((0, 4)), 0.5) == []
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from deep_sort_realtime.deep_sort import nn_matching
+
+
+def reference_distance(metric, samples, features, targets):
+    """Per target distances as computed before the gallery was batched."""
+    nn_distance = {
+        "cosine": nn_matching._nn_cosine_distance,
+        "euclidean": nn_matching._nn_euclidean_distance,
+    }[metric]
+    cost_matrix = np.zeros((len(targets), len(features)))
+    for i, target in enumerate(targets):
+        cost_matrix[i, :] = nn_distance(samples[target], features)
+    return cost_matrix
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+@pytest.mark.parametrize("budget", [None, 5])
+def test_distance_matches_per_target_reference(metric, budget):
+    rng = np.random.default_rng(0)
+    gallery = nn_matching.NearestNeighborDistanceMetric(metric, 0.2, budget)
+    history = {}
+    for step in range(30):
+        active = [t for t in range(12) if step < 4 + 3 * t]
+        targets = [t for t in active if rng.random() < 0.8]
+        features = rng.normal(size=(len(targets), 16)).astype(np.float32)
+        gallery.partial_fit(features, targets, active)
+        for feature, target in zip(features, targets):
+            history.setdefault(target, []).append(feature)
+        history = {t: history[t] for t in active if t in history}
+
+    samples = {
+        t: np.array(h if budget is None else h[-budget:]) for t, h in history.items()
+    }
+    if metric == "cosine":
+        samples = {t: s / np.linalg.norm(s, axis=1, keepdims=True) for t, s in samples.items()}
+    queries = rng.normal(size=(7, 16)).astype(np.float32)
+    # a subset, in arbitrary order and with a repeat
+    requested = [11, 9, 10, 9]
+
+    np.testing.assert_allclose(
+        gallery.distance(queries, requested),
+        reference_distance(metric, samples, queries, requested),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+
+
+def test_unbudgeted_memory_follows_sample_count():
+    # One long lived target must not make every other target's storage grow.
+    dim = 32
+    gallery = nn_matching.NearestNeighborDistanceMetric("cosine", 0.2, budget=None)
+    rng = np.random.default_rng(0)
+    targets = list(range(50))
+    for step in range(2000):
+        alive = [0] if step >= 2 else targets
+        gallery.partial_fit(rng.normal(size=(len(alive), dim)), alive, targets)
+
+    counts = {t: len(s) for t, s in gallery.samples.items()}
+    assert counts[0] == 2000 and all(counts[t] == 2 for t in targets[1:])
+    # buffers double, so at most twice the samples held (plus the initial
+    # buffer of each target), with one float32 norm per row
+    bound = sum(max(2 * n, gallery._initial_capacity) for n in counts.values()) * (dim + 1) * 4
+    assert gallery.nbytes <= bound
+
+
+def test_budget_caps_samples():
+    gallery = nn_matching.NearestNeighborDistanceMetric("euclidean", 0.2, budget=3)
+    features = np.arange(10, dtype=np.float32)[:, np.newaxis] * np.ones((1, 4), np.float32)
+    for feature in features:
+        gallery.partial_fit(feature[np.newaxis], [1], [1])
+    assert sorted(gallery.samples[1][:, 0]) == [7.0, 8.0, 9.0]
+    assert gallery.nbytes == 3 * 5 * 4
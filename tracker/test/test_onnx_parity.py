@@ -0,0 +1,92 @@
+"""Features of the onnxruntime MobileNetV2 embedder against the torch one,
+with the same (randomly initialised) weights, and the cache of the exported
+model."""
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+
+from deep_sort_realtime.embedder import cache, embedder_onnx
+from deep_sort_realtime.embedder.embedder_onnx import MobileNetv2_ONNX_Embedder
+from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
+from deep_sort_realtime.embedder.mobilenetv2_bottle import MobileNetV2_bottle
+
+
+def save_random_weights(path, seed):
+    torch.manual_seed(seed)
+    model = MobileNetV2_bottle(input_size=224, width_mult=1.0)
+    # the default init shrinks activations layer by layer to ~1e-9 features
+    for module in model.modules():
+        if isinstance(module, torch.nn.Conv2d):
+            torch.nn.init.kaiming_normal_(module.weight, nonlinearity="relu")
+    torch.save(model.state_dict(), path)
+
+
+@pytest.fixture(scope="module")
+def model_wts_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("weights") / "mobilenetv2_random.pt"
+    save_random_weights(path, seed=0)
+    return str(path)
+
+
+@pytest.fixture
+def user_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "USER_CACHE_DIR", str(tmp_path / "user_cache"))
+    return tmp_path / "user_cache"
+
+
+def random_crops(n=5):
+    rng = np.random.default_rng(0)
+    return [
+        rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        for h, w in rng.integers(20, 300, (n, 2))
+    ]
+
+
+def test_onnx_matches_torch(model_wts_path):
+    # more crops than a batch, of assorted sizes
+    crops = random_crops()
+    torch_embedder = MobileNetv2_Embedder(model_wts_path, max_batch_size=4, gpu=False)
+    onnx_embedder = MobileNetv2_ONNX_Embedder(model_wts_path, max_batch_size=4)
+
+    expected = np.array(torch_embedder.predict(crops))
+    features = np.array(onnx_embedder.predict(crops))
+    assert features.shape == (len(crops), 1280)
+    assert np.abs(expected).mean() > 0.1
+    np.testing.assert_allclose(features, expected, rtol=1e-3, atol=1e-4)
+
+
+def test_replaced_weights_are_exported_again(model_wts_path, tmp_path, user_cache_dir):
+    path = tmp_path / "mobilenetv2.pt"
+    shutil.copy(model_wts_path, path)
+    crops = random_crops(2)
+    old = np.array(MobileNetv2_ONNX_Embedder(str(path)).predict(crops))
+
+    save_random_weights(path, seed=1)
+    expected = np.array(MobileNetv2_Embedder(str(path), gpu=False).predict(crops))
+    features = np.array(MobileNetv2_ONNX_Embedder(str(path)).predict(crops))
+    assert not np.allclose(features, old)
+    np.testing.assert_allclose(features, expected, rtol=1e-3, atol=1e-4)
+    # the export of the previous weights was replaced
+    assert len(list(tmp_path.glob("*.onnx"))) == 1
+
+
+def test_read_only_weights_dir_falls_back_to_user_cache(model_wts_path, tmp_path, user_cache_dir, monkeypatch):
+    weights_dir = tmp_path / "read_only"
+    weights_dir.mkdir()
+    path = shutil.copy(model_wts_path, weights_dir)
+    export = embedder_onnx.export_mobilenetv2_onnx
+
+    def export_outside_weights_dir(wts_path, onnx_path):
+        if os.path.dirname(onnx_path) == str(weights_dir):
+            raise PermissionError(13, "Permission denied", onnx_path)
+        export(wts_path, onnx_path)
+
+    monkeypatch.setattr(embedder_onnx, "export_mobilenetv2_onnx", export_outside_weights_dir)
+    MobileNetv2_ONNX_Embedder(str(path))
+    assert len(list(user_cache_dir.glob("*.onnx"))) == 1
+    assert not list(weights_dir.glob("*.onnx"))
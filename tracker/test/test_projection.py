@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from deep_sort_realtime.deepsort_tracker import DeepSort
+from deep_sort_realtime.embedder.projection import fit_projection
+
+IN_DIM, OUT_DIM = 64, 8
+
+
+class ColorEmbedder(object):
+    """Mean colour of each crop, tiled to IN_DIM features."""
+
+    def predict(self, crops):
+        return [np.tile(crop.reshape(-1, 3).mean(axis=0), IN_DIM // 3 + 1)[:IN_DIM] for crop in crops]
+
+
+def scene(n_frames=20, seed=0):
+    """Frames with a few parked and moving coloured boxes, and their detections."""
+    rng = np.random.default_rng(seed)
+    boxes = rng.uniform(50, 500, (6, 2))
+    velocity = np.zeros((6, 2))
+    velocity[3:] = rng.normal(0, 5, (3, 2))
+    colors = rng.integers(0, 256, (6, 3))
+    for _ in range(n_frames):
+        boxes += velocity
+        frame = np.zeros((700, 700, 3), dtype=np.uint8)
+        detections = []
+        for (x, y), color in zip(boxes.astype(int), colors):
+            frame[y : y + 60, x : x + 40] = color
+            detections.append(([x, y, 40, 60], 0.9, "bicycle"))
+        yield frame, detections
+
+
+@pytest.fixture
+def projection():
+    rng = np.random.default_rng(1)
+    return fit_projection(rng.normal(size=(200, IN_DIM)), dim=OUT_DIM)
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"lazy_embedding": True}, {"refresh_interval": 5}], ids=["eager", "lazy", "refresh"]
+)
+def test_gallery_holds_projected_features_only(projection, kwargs):
+    tracker = DeepSort(embedder=None, n_init=1, embedder_projection=projection, **kwargs)
+    tracker.embedder = ColorEmbedder()
+    for frame, detections in scene():
+        tracks = tracker.update_tracks(detections, frame=frame)
+        assert all(track.get_feature().shape == (OUT_DIM,) for track in tracks)
+    samples = tracker.tracker.metric.samples
+    assert samples
+    assert all(s.shape[1] == OUT_DIM for s in samples.values())
+
+
+def test_given_embeds_are_projected(projection):
+    tracker = DeepSort(embedder=None, n_init=1, embedder_projection=projection)
+    for frame, detections in scene(n_frames=3):
+        embeds = ColorEmbedder().predict(DeepSort.crop_bb(frame, detections)[0])
+        tracker.update_tracks(detections, embeds=embeds)
+    assert all(s.shape[1] == OUT_DIM for s in tracker.tracker.metric.samples.values())
+
+
+def test_features_of_the_wrong_size_are_rejected(projection):
+    tracker = DeepSort(embedder=None, embedder_projection=projection)
+    with pytest.raises(ValueError):
+        tracker.update_tracks([([10, 10, 40, 60], 0.9, "bicycle")], embeds=[np.zeros(OUT_DIM)])
@@ -0,0 +1,110 @@
+"""Tracks of the batched tracker against the per-track implementation it
+replaced, on a simulated scene.
+
+`baseline_tracks.npz` holds the output of `simulate` on the tree before the
+tracker was batched (git 8a937ac), regenerated with:
+
+    git worktree add /tmp/baseline 8a937ac
+    PYTHONPATH=/tmp/baseline/tracker python tracker/test/test_tracker_baseline.py tracker/test/data/baseline_tracks.npz
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASELINE = os.path.join(os.path.dirname(__file__), "data", "baseline_tracks.npz")
+BUDGETS = {"unbudgeted": None, "budget20": 20}
+
+
+def simulate(nn_budget, n_objects=40, n_frames=150, seed=0, track_class=None):
+    """
+    Track objects moving (half of them parked) with noisy boxes, missed
+    detections and noisy appearance features, given in a shuffled order.
+
+    Returns
+    -------
+    ndarray
+        One row per track and frame: frame index, confirmed, time since
+        update and the ltrb box, sorted by frame and box.
+
+    """
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    rng = np.random.default_rng(seed)
+    tracker = DeepSort(
+        embedder=None,
+        max_age=30,
+        n_init=3,
+        nn_budget=nn_budget,
+        override_track_class=track_class,
+    )
+    position = rng.uniform(0, 1500, (n_objects, 2))
+    velocity = rng.normal(0, 3, (n_objects, 2))
+    velocity[: n_objects // 2] = 0
+    size = rng.uniform(30, 120, (n_objects, 2))
+    appearance = rng.normal(size=(n_objects, 64))
+
+    rows = []
+    for frame in range(n_frames):
+        position += velocity
+        visible = np.flatnonzero(rng.random(n_objects) > 0.15)
+        detections, embeds = [], []
+        for i in visible:
+            box = list(position[i] + rng.normal(0, 2, 2)) + list(size[i])
+            detections.append((box, float(rng.uniform(0.5, 1)), "bicycle"))
+            embeds.append(appearance[i] + rng.normal(0, 0.3, 64))
+        order = rng.permutation(len(detections))
+        tracks = tracker.update_tracks(
+            [detections[k] for k in order], embeds=[embeds[k] for k in order]
+        )
+        frame_rows = [
+            [frame, track.is_confirmed(), track.time_since_update, *track.to_ltrb()]
+            for track in tracks
+        ]
+        rows.extend(sorted(frame_rows, key=lambda row: row[3:]))
+    return np.array(rows, dtype=np.float64).reshape(-1, 7)
+
+
+@pytest.mark.parametrize("name", sorted(BUDGETS))
+def test_tracks_match_baseline(name):
+    expected = np.load(BASELINE)[name]
+    tracks = simulate(BUDGETS[name])
+    assert tracks.shape == expected.shape
+    # frame, state and time since update exactly; boxes up to rounding, as the
+    # baseline returned float32 boxes for tracks created in the current frame
+    np.testing.assert_array_equal(tracks[:, :3], expected[:, :3])
+    np.testing.assert_allclose(tracks[:, 3:], expected[:, 3:], rtol=1e-6)
+
+
+def test_overridden_track_methods_are_called():
+    from deep_sort_realtime.deep_sort.track import Track
+
+    calls = {"predict": 0, "update": 0, "is_confirmed": 0, "is_deleted": 0}
+
+    class CountingTrack(Track):
+        def predict(self, kf):
+            calls["predict"] += 1
+            super().predict(kf)
+
+        def update(self, kf, detection):
+            calls["update"] += 1
+            super().update(kf, detection)
+
+        def is_confirmed(self):
+            calls["is_confirmed"] += 1
+            return super().is_confirmed()
+
+        def is_deleted(self):
+            calls["is_deleted"] += 1
+            return super().is_deleted()
+
+    expected = np.load(BASELINE)["budget20"]
+    tracks = simulate(20, track_class=CountingTrack)
+    assert all(count > 0 for count in calls.values()), calls
+    np.testing.assert_array_equal(tracks[:, :3], expected[:, :3])
+    np.testing.assert_allclose(tracks[:, 3:], expected[:, 3:], rtol=1e-6)
+
+
+if __name__ == "__main__":
+    np.savez_compressed(sys.argv[1], **{name: simulate(budget) for name, budget in BUDGETS.items()})